@@ -11,11 +11,18 @@ if config.config_file_name is not None:
 # Указываем метаданные моделей
 target_metadata = Base.metadata
 
+def include_object(object, name, type_, reflected, compare_to):
+    # FTS5-индекс и его служебные таблицы создаются вручную, autogenerate их не трогает
+    if type_ == "table" and name.startswith("items_fts"):
+        return False
+    return True
+
 def run_migrations_offline():
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -29,7 +36,8 @@ def run_migrations_online():
     with connectable.connect() as connection:
         context.configure(
             connection=connection, 
-            target_metadata=target_metadata
+            target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
@@ -0,0 +1,35 @@
+"""Add change log
+
+Revision ID: 3b9d2e7c41a8
+Revises: f66c185142cd
+Create Date: 2025-06-02 11:40:12.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9d2e7c41a8'
+down_revision: Union[str, None] = 'f66c185142cd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'change_log',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('table_name', sa.String(), nullable=True),
+        sa.Column('row_id', sa.Integer(), nullable=True),
+        sa.Column('operation', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_change_log_table_name'), 'change_log', ['table_name'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_change_log_table_name'), table_name='change_log')
+    op.drop_table('change_log')
@@ -0,0 +1,64 @@
+"""Add items full-text search index
+
+Revision ID: 8c41f07a2d95
+Revises: 3b9d2e7c41a8
+Create Date: 2025-06-09 15:02:47.551930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41f07a2d95'
+down_revision: Union[str, None] = '3b9d2e7c41a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+            name, parameter_value, category_name,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+            INSERT INTO items_fts (rowid, name, parameter_value, category_name)
+            VALUES (new.id, new.name, new.parameter_value, (SELECT name FROM categories WHERE id = new.category_id));
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+            DELETE FROM items_fts WHERE rowid = old.id;
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE ON items BEGIN
+            DELETE FROM items_fts WHERE rowid = old.id;
+            INSERT INTO items_fts (rowid, name, parameter_value, category_name)
+            VALUES (new.id, new.name, new.parameter_value, (SELECT name FROM categories WHERE id = new.category_id));
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS items_fts_category_update AFTER UPDATE OF name ON categories BEGIN
+            UPDATE items_fts SET category_name = new.name
+            WHERE rowid IN (SELECT id FROM items WHERE category_id = new.id);
+        END
+    """)
+    op.execute("DELETE FROM items_fts")
+    op.execute("""
+        INSERT INTO items_fts (rowid, name, parameter_value, category_name)
+        SELECT i.id, i.name, i.parameter_value, c.name
+        FROM items i LEFT JOIN categories c ON c.id = i.category_id
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS items_fts_category_update")
+    op.execute("DROP TRIGGER IF EXISTS items_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS items_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS items_fts_insert")
+    op.execute("DROP TABLE IF EXISTS items_fts")
@@ -0,0 +1,31 @@
+"""Add sync meta for change log compaction
+
+Revision ID: a9d3f6c28e15
+Revises: e2a7c9f4b610
+Create Date: 2025-06-20 12:08:31.604927
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d3f6c28e15'
+down_revision: Union[str, None] = 'e2a7c9f4b610'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sync_meta',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('sync_meta')
@@ -0,0 +1,72 @@
+"""Add category closure table
+
+Revision ID: d5e8a1c3f207
+Revises: 8c41f07a2d95
+Create Date: 2025-06-11 10:24:13.308412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e8a1c3f207'
+down_revision: Union[str, None] = '8c41f07a2d95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'category_closure',
+        sa.Column('ancestor', sa.Integer(), nullable=False),
+        sa.Column('descendant', sa.Integer(), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('ancestor', 'descendant')
+    )
+    op.create_index(op.f('ix_category_closure_descendant'), 'category_closure', ['descendant'], unique=False)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS category_closure_insert AFTER INSERT ON categories BEGIN
+            INSERT INTO category_closure (ancestor, descendant, depth)
+            SELECT ancestor, new.id, depth + 1 FROM category_closure WHERE descendant = new.parent_id
+            UNION ALL
+            SELECT new.id, new.id, 0;
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS category_closure_move AFTER UPDATE OF parent_id ON categories
+        WHEN old.parent_id IS NOT new.parent_id BEGIN
+            DELETE FROM category_closure
+            WHERE descendant IN (SELECT descendant FROM category_closure WHERE ancestor = new.id)
+              AND ancestor NOT IN (SELECT descendant FROM category_closure WHERE ancestor = new.id);
+            INSERT INTO category_closure (ancestor, descendant, depth)
+            SELECT above.ancestor, below.descendant, above.depth + below.depth + 1
+            FROM category_closure above, category_closure below
+            WHERE above.descendant = new.parent_id AND below.ancestor = new.id;
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS category_closure_delete AFTER DELETE ON categories BEGIN
+            DELETE FROM category_closure WHERE descendant = old.id OR ancestor = old.id;
+        END
+    """)
+    op.execute("""
+        INSERT INTO category_closure (ancestor, descendant, depth)
+        WITH RECURSIVE tree(ancestor, descendant, depth) AS (
+            SELECT id, id, 0 FROM categories
+            UNION ALL
+            SELECT tree.ancestor, c.id, tree.depth + 1
+            FROM tree JOIN categories c ON c.parent_id = tree.descendant
+        )
+        SELECT ancestor, descendant, depth FROM tree
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS category_closure_delete")
+    op.execute("DROP TRIGGER IF EXISTS category_closure_move")
+    op.execute("DROP TRIGGER IF EXISTS category_closure_insert")
+    op.drop_index(op.f('ix_category_closure_descendant'), table_name='category_closure')
+    op.drop_table('category_closure')
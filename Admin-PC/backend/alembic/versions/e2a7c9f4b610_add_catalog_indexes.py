@@ -0,0 +1,29 @@
+"""Add composite indexes for catalog queries
+
+Revision ID: e2a7c9f4b610
+Revises: d5e8a1c3f207
+Create Date: 2025-06-12 09:41:55.127604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7c9f4b610'
+down_revision: Union[str, None] = 'd5e8a1c3f207'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_categories_tab_parent_group_position', 'categories', ['tab', 'parent_id', 'group', 'position'], unique=False)
+    op.create_index('ix_categories_parent_group_position', 'categories', ['parent_id', 'group', 'position'], unique=False)
+    op.create_index(op.f('ix_items_category_id'), 'items', ['category_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_items_category_id'), table_name='items')
+    op.drop_index('ix_categories_parent_group_position', table_name='categories')
+    op.drop_index('ix_categories_tab_parent_group_position', table_name='categories')
@@ -1,33 +1,137 @@
+import csv
+import io
 import json
 import os
+import re
 import logging
 import uuid
 import hashlib
-from typing import List, Optional
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
-from fastapi.responses import FileResponse
+import itertools
+import hmac
+import secrets
+import time
+import gzip
+import shutil
+import sqlite3
+import threading
+import tempfile
+import asyncio
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Literal, Optional, Union
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Request, Response, BackgroundTasks, Query, Header
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from passlib.context import CryptContext
-from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Boolean, Enum
+from pydantic import BaseModel, Field, field_validator
+from sqlalchemy import and_, or_, bindparam, create_engine, event, func, select, text, Column, Integer, String, ForeignKey, Boolean, Enum, Index
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import Session, sessionmaker, relationship, joinedload
 import bcrypt
 from enum import Enum as PyEnum
 
+try:
+    from PIL import Image as PILImage, ImageOps
+except ImportError:  # Без Pillow уменьшенные копии не создаются, отдается оригинал
+    PILImage = None
+
+try:
+    import zstandard
+except ImportError:  # Без zstandard снимки БД сжимаются только gzip
+    zstandard = None
+
+try:
+    import openpyxl
+except ImportError:  # Без openpyxl импорт и экспорт товаров работают только с CSV
+    openpyxl = None
+
 # Logger setup
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Constants and paths
-SERVER_DIR = r"C:\serverShiDari"
+# SHIDARI_SERVER_DIR позволяет запустить сервер (и тесты) на отдельной папке данных
+SERVER_DIR = os.environ.get("SHIDARI_SERVER_DIR", r"C:\serverShiDari")
 IMGS_DIR = os.path.join(SERVER_DIR, "Imgs")
+IMG_SIZES_DIR = os.path.join(IMGS_DIR, "sizes")
 CONFIG_PATH = os.path.join(SERVER_DIR, "db.json")
 DEFAULT_DB_PATH = os.path.join(SERVER_DIR, "back.db")
+SNAPSHOTS_DIR = os.path.join(SERVER_DIR, "snapshots")
+SNAPSHOT_KEEP = 3  # сколько последних снимков БД хранить
+SNAPSHOT_DELAY = 2.0  # пауза после последней записи перед сборкой снимка, секунды
+# Заранее сжатые копии снимка: Content-Encoding -> (расширение, уровень сжатия)
+SNAPSHOT_ENCODINGS = {
+    "zstd": (".zst", 10),
+    "gzip": (".gz", 6),
+}
+GZIP_MINIMUM_SIZE = 1024
 DEFAULT_IMAGE_PATH = os.path.join(os.path.dirname(__file__), "default.jpg")
+MAX_PAGE_SIZE = 500
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+IMPORT_BATCH_SIZE = 500  # строк на один executemany при импорте товаров
+MAX_IMPORT_ROWS = 50000
+MAX_IMPORT_ERRORS = 50  # сколько ошибок валидации возвращать клиенту
+EXPORT_BATCH_SIZE = 1000
+# Колонки выгрузки товаров; id и category при импорте не читаются
+ITEM_EXPORT_COLUMNS = (
+    "id", "name", "category_id", "category", "parameter_value",
+    "unit", "cost_price", "selling_price", "mic", "image_id",
+)
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Уменьшенные копии изображений: имя -> (ширина, высота, обрезать по размеру)
+IMAGE_SIZES = {
+    "thumb": (120, 100, True),
+    "card": (300, 300, False),
+}
+
+# Профиль SQLite по умолчанию, переопределяется секцией "sqlite" в db.json
+DEFAULT_SQLITE_PROFILE = {
+    "journal_mode": "WAL",  # читатели не ждут писателя
+    "synchronous": "NORMAL",  # в WAL безопасно, fsync только при checkpoint
+    "busy_timeout": 5000,  # мс ожидания блокировки вместо "database is locked"
+    "cache_size": -32768,  # 32 МБ на соединение
+    "mmap_size": 268435456,  # 256 МБ
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+}
+DB_MAINTENANCE_INTERVAL = 600  # секунды между PRAGMA optimize и checkpoint
+# bcrypt занимает ~250 мс CPU: считаем его в отдельном маленьком пуле, лишние запросы отклоняем
+PASSWORD_WORKERS = 2
+PASSWORD_QUEUE_LIMIT = 16
+SESSION_TTL = 12 * 60 * 60  # секунды жизни токена сессии
+SESSION_CACHE_LIMIT = 1000
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    maintenance = asyncio.create_task(run_db_maintenance())
+    try:
+        yield
+    finally:
+        maintenance.cancel()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+class JSONGZipMiddleware(GZipMiddleware):
+    """Сжимает ответы API. Файлы отдаются как есть: изображения уже сжаты,
+    а снимки БД сжимаются заранее в download_db"""
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        is_file = (
+            path.startswith(("/download_img/", "/download_db"))
+            or (path.startswith("/imgs/") and path != "/imgs/manifest")
+        )
+        if scope["type"] == "http" and is_file:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(JSONGZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 
 # Настройки CORS
 app.add_middleware(
@@ -40,11 +144,31 @@ app.add_middleware(
 
 os.makedirs(SERVER_DIR, exist_ok=True)
 os.makedirs(IMGS_DIR, exist_ok=True)
+os.makedirs(IMG_SIZES_DIR, exist_ok=True)
+os.makedirs(SNAPSHOTS_DIR, exist_ok=True)
 
 # Database configuration
 Base = declarative_base()
 
+def load_sqlite_profile() -> dict:
+    profile = dict(DEFAULT_SQLITE_PROFILE)
+    try:
+        with open(CONFIG_PATH, "r") as f:
+            profile.update(json.load(f).get("sqlite", {}))
+    except (FileNotFoundError, ValueError):
+        pass
+    return profile
+
+sqlite_profile = load_sqlite_profile()
 engine = create_engine(f"sqlite:///{os.path.abspath(DEFAULT_DB_PATH)}", connect_args={"check_same_thread": False})
+
+@event.listens_for(engine, "connect")
+def apply_sqlite_profile(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in sqlite_profile.items():
+        cursor.execute(f"PRAGMA {pragma} = {value}")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) 
 
 # Security
@@ -88,11 +212,17 @@ class Category(Base):
     children = relationship("Category", back_populates="parent", cascade="all, delete")
     items = relationship("Item", back_populates="category", cascade="all, delete")
 
+    # Списки категорий: фильтр по вкладке и родителю, сортировка по группе и позиции
+    __table_args__ = (
+        Index("ix_categories_tab_parent_group_position", "tab", "parent_id", "group", "position"),
+        Index("ix_categories_parent_group_position", "parent_id", "group", "position"),
+    )
+
 class Item(Base):
     __tablename__ = "items"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    category_id = Column(Integer, ForeignKey("categories.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
     parameter_value = Column(String)
     unit = Column(String)
     cost_price = Column(Integer)
@@ -101,6 +231,113 @@ class Item(Base):
     image_id = Column(String, nullable=True)
     category = relationship("Category", back_populates="items")
 
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+    id = Column(Integer, primary_key=True)  # Номер ревизии
+    table_name = Column(String, index=True)
+    row_id = Column(Integer)
+    operation = Column(String)  # "upsert" или "delete"
+
+class SyncMeta(Base):
+    __tablename__ = "sync_meta"
+    # change_log_floor: ревизия, до которой журнал сжат; /sync от более ранней ревизии невозможен
+    key = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False)
+
+class CategoryClosure(Base):
+    __tablename__ = "category_closure"
+    # Все пары предок-потомок, включая саму категорию с depth = 0
+    ancestor = Column(Integer, primary_key=True)
+    descendant = Column(Integer, primary_key=True, index=True)
+    depth = Column(Integer, nullable=False)
+
+# Таблицы, изменения которых отдаются клиентам через /sync (в порядке зависимостей)
+SYNC_TABLES = ("roles", "users", "categories", "items")
+
+# Таблица замыкания поддерживается триггерами в той же транзакции, что и изменение категорий.
+# Триггеры лежат в back.db, поэтому на планшетах она обновляется при применении /sync
+CATEGORY_CLOSURE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS category_closure_insert AFTER INSERT ON categories BEGIN
+        INSERT INTO category_closure (ancestor, descendant, depth)
+        SELECT ancestor, new.id, depth + 1 FROM category_closure WHERE descendant = new.parent_id
+        UNION ALL
+        SELECT new.id, new.id, 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS category_closure_move AFTER UPDATE OF parent_id ON categories
+    WHEN old.parent_id IS NOT new.parent_id BEGIN
+        DELETE FROM category_closure
+        WHERE descendant IN (SELECT descendant FROM category_closure WHERE ancestor = new.id)
+          AND ancestor NOT IN (SELECT descendant FROM category_closure WHERE ancestor = new.id);
+        INSERT INTO category_closure (ancestor, descendant, depth)
+        SELECT above.ancestor, below.descendant, above.depth + below.depth + 1
+        FROM category_closure above, category_closure below
+        WHERE above.descendant = new.parent_id AND below.ancestor = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS category_closure_delete AFTER DELETE ON categories BEGIN
+        DELETE FROM category_closure WHERE descendant = old.id OR ancestor = old.id;
+    END
+    """,
+]
+CATEGORY_CLOSURE_REBUILD = """
+    INSERT INTO category_closure (ancestor, descendant, depth)
+    WITH RECURSIVE tree(ancestor, descendant, depth) AS (
+        SELECT id, id, 0 FROM categories
+        UNION ALL
+        SELECT tree.ancestor, c.id, tree.depth + 1
+        FROM tree JOIN categories c ON c.parent_id = tree.descendant
+    )
+    SELECT ancestor, descendant, depth FROM tree
+"""
+
+# Полнотекстовый поиск (FTS5). Индекс живет в back.db и синхронизируется триггерами,
+# поэтому вместе с базой попадает и на планшеты
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        name, parameter_value, category_name,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts (rowid, name, parameter_value, category_name)
+        VALUES (new.id, new.name, new.parameter_value, (SELECT name FROM categories WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+        DELETE FROM items_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE ON items BEGIN
+        DELETE FROM items_fts WHERE rowid = old.id;
+        INSERT INTO items_fts (rowid, name, parameter_value, category_name)
+        VALUES (new.id, new.name, new.parameter_value, (SELECT name FROM categories WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_category_update AFTER UPDATE OF name ON categories BEGIN
+        UPDATE items_fts SET category_name = new.name
+        WHERE rowid IN (SELECT id FROM items WHERE category_id = new.id);
+    END
+    """,
+]
+SEARCH_INDEX_REBUILD = """
+    INSERT INTO items_fts (rowid, name, parameter_value, category_name)
+    SELECT i.id, i.name, i.parameter_value, c.name
+    FROM items i LEFT JOIN categories c ON c.id = i.category_id
+"""
+# Веса BM25 для колонок name, parameter_value, category_name
+SEARCH_RANKING = "bm25(items_fts, 10.0, 2.0, 1.0)"
+DEFAULT_SEARCH_LIMIT = 50
+search_index_available = False
+
 # Pydantic schemas
 class RoleBase(BaseModel):
     name: str
@@ -149,6 +386,21 @@ class CategoryResponse(CategoryCreate):
         "from_attributes": True
     }
 
+class CategoryPathEntry(BaseModel):
+    id: int
+    name: str
+    parent_id: Optional[int] = None
+    depth: int  # Расстояние до запрошенной категории
+    model_config = {
+        "from_attributes": True
+    }
+
+class CategoryTreeNode(CategoryCreate):
+    id: int
+    item_count: Optional[int] = None  # Товары непосредственно в категории
+    total_item_count: Optional[int] = None  # Товары во всем поддереве
+    children: List['CategoryTreeNode'] = []
+
 class ItemBase(BaseModel):
     name: str
     category_id: int
@@ -168,6 +420,15 @@ class ItemResponse(ItemCreate):
         "from_attributes": True
     }
 
+# Pagination models
+class ItemPage(BaseModel):
+    items: List[ItemResponse]
+    next_cursor: Optional[int] = None
+
+class CategoryPage(BaseModel):
+    items: List[CategoryResponse]
+    next_cursor: Optional[int] = None
+
 # Update models
 class RoleUpdate(RoleBase):
     pass
@@ -184,6 +445,7 @@ class CategoryUpdate(BaseModel):
     unit: Optional[str] = None
     mic: Optional[int] = None
     tab: Optional[int] = None
+    parent_id: Optional[int] = None
     content_type: Optional[ContentType] = None
 
 class ItemUpdate(BaseModel):
@@ -195,7 +457,79 @@ class ItemUpdate(BaseModel):
     selling_price: Optional[int] = None
     image_id: Optional[str] = None
 
+class ItemPatch(BaseModel):
+    id: int
+    name: Optional[str] = None
+    parameter_value: Optional[str] = None
+    unit: Optional[str] = None
+    cost_price: Optional[int] = None
+    selling_price: Optional[int] = None
+    mic: Optional[int] = None
+    image_id: Optional[str] = None
+
+    # Поле можно не передавать, но явный null стер бы значение; сбросить можно только image_id
+    @field_validator("name", "parameter_value", "unit", "cost_price", "selling_price", "mic")
+    @classmethod
+    def reject_null(cls, value):
+        if value is None:
+            raise ValueError("must not be null")
+        return value
+
+class PriceRule(BaseModel):
+    # Область правила задается явно, ровно одним из полей: category_id, ids или all
+    category_id: Optional[int] = None
+    subtree: bool = True  # вместе с вложенными категориями
+    ids: Optional[List[int]] = None  # конкретные товары
+    all: bool = False  # весь каталог - только по явному флагу
+    field: Literal["selling_price", "cost_price"] = "selling_price"
+    percent: float = Field(0, ge=-100)
+    amount: int = 0  # добавляется после процента
+    round_to: int = Field(1, ge=1)  # результат округляется до кратного
+
+class ItemBulkUpdate(BaseModel):
+    # Либо список изменений по товарам, либо правило для группы
+    patches: Optional[List[ItemPatch]] = None
+    rule: Optional[PriceRule] = None
+
 # Utility functions
+def paginate_by_id(query, id_column, after_id: Optional[int], limit: int):
+    """Keyset-пагинация по первичному ключу: возвращает строки страницы и курсор следующей"""
+    if after_id is not None:
+        query = query.filter(id_column > after_id)
+    rows = query.order_by(id_column).limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+def _sorts_after(column, value):
+    # В SQLite NULL при сортировке по возрастанию идет первым
+    return column.isnot(None) if value is None else column > value
+
+def _sorts_same(column, value):
+    return column.is_(None) if value is None else column == value
+
+def paginate_categories(db: Session, query, after_id: Optional[int], limit: int):
+    """Keyset-пагинация категорий в порядке отображения: group, position, id.
+
+    Курсор - id последней категории страницы, граница следующей берется из ее group и position.
+    Порядок совпадает с индексами ix_categories_*_group_position (id в них хранится как rowid).
+    """
+    if after_id is not None:
+        anchor = db.get(Category, after_id)
+        if anchor is None:
+            raise HTTPException(status_code=400, detail="Cursor category no longer exists, restart from the first page")
+        query = query.filter(or_(
+            _sorts_after(Category.group, anchor.group),
+            and_(_sorts_same(Category.group, anchor.group), or_(
+                _sorts_after(Category.position, anchor.position),
+                and_(_sorts_same(Category.position, anchor.position), Category.id > anchor.id)
+            ))
+        ))
+    rows = query.order_by(Category.group, Category.position, Category.id).limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
 def get_db_path():
     try:
         with open(CONFIG_PATH, "r") as f:
@@ -213,26 +547,700 @@ def init_db():
             logger.error(f"Error initializing database: {e}")
             raise
     else:
+        # Старые базы могли быть созданы до появления журнала изменений
+        ChangeLog.__table__.create(bind=engine, checkfirst=True)
+        SyncMeta.__table__.create(bind=engine, checkfirst=True)
+        CategoryClosure.__table__.create(bind=engine, checkfirst=True)
+        for index in (*Category.__table__.indexes, *Item.__table__.indexes):
+            index.create(bind=engine, checkfirst=True)
         logger.info("Database already exists")
+    init_category_closure()
+    init_search_index()
+
+def init_category_closure():
+    """Создает триггеры таблицы замыкания и перестраивает ее, если она не совпадает с categories"""
+    with engine.begin() as conn:
+        for statement in CATEGORY_CLOSURE_TRIGGERS:
+            conn.exec_driver_sql(statement)
+        categories = conn.exec_driver_sql("SELECT COUNT(*) FROM categories").scalar()
+        roots = conn.exec_driver_sql("SELECT COUNT(*) FROM category_closure WHERE depth = 0").scalar()
+        if categories != roots:
+            conn.exec_driver_sql("DELETE FROM category_closure")
+            conn.exec_driver_sql(CATEGORY_CLOSURE_REBUILD)
+            logger.info("Category closure table rebuilt")
+
+def init_search_index():
+    """Создает FTS5-индекс товаров и триггеры, при первом создании заполняет его"""
+    global search_index_available
+    try:
+        with engine.begin() as conn:
+            created = not conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE name = 'items_fts'"
+            ).first()
+            for statement in SEARCH_INDEX_DDL:
+                conn.exec_driver_sql(statement)
+            if created:
+                conn.exec_driver_sql(SEARCH_INDEX_REBUILD)
+        search_index_available = True
+    except Exception as e:
+        # Сборка SQLite без FTS5 - поиск работает через LIKE
+        logger.error(f"Full-text search index unavailable: {e}")
+        search_index_available = False
+
+def build_search_query(query: str) -> str:
+    # Каждое слово ищется по префиксу, все слова должны совпасть
+    tokens = re.findall(r"\w+", query)
+    return " ".join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+
+def load_config() -> dict:
+    try:
+        with open(CONFIG_PATH, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
 
 def save_db_path(db_path: str):
+    config = load_config()
+    config["db_file_path"] = db_path
     with open(CONFIG_PATH, "w") as f:
-        json.dump({"db_file_path": db_path}, f)
+        json.dump(config, f)
+
+def optimize_db():
+    """Обновляет статистику планировщика и переносит WAL в основной файл"""
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA optimize")
+        # PASSIVE не ждет читателей и не блокирует запись
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+
+async def run_db_maintenance():
+    while True:
+        await asyncio.sleep(DB_MAINTENANCE_INTERVAL)
+        try:
+            await asyncio.to_thread(optimize_db)
+            revision = latest_snapshot_revision()
+            if revision is not None:
+                await asyncio.to_thread(compact_change_log, revision)
+        except Exception as e:
+            logger.error(f"Database maintenance failed: {e}")
 
 def save_image(image_file: UploadFile) -> str:
     image_id = str(uuid.uuid4())
     image_path = os.path.join(IMGS_DIR, f"{image_id}.jpg")
-    with open(image_path, "wb") as buffer:
-        buffer.write(image_file.file.read())
+    temp_path = f"{image_path}.part"
+    written = 0
+    try:
+        with open(temp_path, "wb") as buffer:
+            for chunk in iter(lambda: image_file.file.read(UPLOAD_CHUNK_SIZE), b""):
+                written += len(chunk)
+                if written > MAX_IMAGE_SIZE:
+                    raise HTTPException(status_code=413, detail="Image is too large")
+                buffer.write(chunk)
+        os.replace(temp_path, image_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
     return image_id
 
+def get_image_variant_path(image_id: str, size: str) -> str:
+    return os.path.join(IMG_SIZES_DIR, f"{image_id}_{size}.jpg")
+
+_variants_in_progress = set()
+_variants_lock = threading.Lock()
+
+def generate_image_variants(image_id: str):
+    """Создает уменьшенные копии изображения для сетки и карточек"""
+    if PILImage is None:
+        return
+    with _variants_lock:
+        if image_id in _variants_in_progress:
+            return
+        _variants_in_progress.add(image_id)
+
+    image_path = os.path.join(IMGS_DIR, f"{image_id}.jpg")
+    try:
+        with PILImage.open(image_path) as original:
+            original = ImageOps.exif_transpose(original).convert("RGB")
+            for size, (width, height, crop) in IMAGE_SIZES.items():
+                if crop:
+                    variant = ImageOps.fit(original, (width, height), PILImage.LANCZOS)
+                else:
+                    variant = original.copy()
+                    variant.thumbnail((width, height), PILImage.LANCZOS)
+                variant_path = get_image_variant_path(image_id, size)
+                variant.save(f"{variant_path}.part", "JPEG", quality=85, optimize=True)
+                os.replace(f"{variant_path}.part", variant_path)
+    except Exception as e:
+        logger.error(f"Error generating variants for image {image_id}: {e}")
+    finally:
+        with _variants_lock:
+            _variants_in_progress.discard(image_id)
+
+# Хеши изображений кешируются по (размер, mtime), чтобы не перечитывать файлы
+_image_hashes = {}
+
+def get_image_hash(path: str, size: int, mtime: float) -> str:
+    key = os.path.abspath(path)
+    cached = _image_hashes.get(key)
+    if cached and cached[0] == size and cached[1] == mtime:
+        return cached[2]
+
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    _image_hashes[key] = (size, mtime, digest.hexdigest())
+    return digest.hexdigest()
+
+# Изображения адресуются UUID и не меняются, поэтому их можно кешировать навсегда
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+def cached_file_response(
+    request: Request,
+    path: str,
+    immutable: bool = True,
+    filename: Optional[str] = None,
+    etag: Optional[str] = None,
+    headers: Optional[dict] = None,
+    media_type: Optional[str] = None
+):
+    """FileResponse с сильным ETag и ответом 304 на If-None-Match / If-Modified-Since.
+
+    Без etag он считается по содержимому файла.
+    """
+    stat = os.stat(path)
+    etag = f'"{etag or get_image_hash(path, stat.st_size, stat.st_mtime)}"'
+    headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in candidates or etag in candidates:
+            return Response(status_code=304, headers=headers)
+    elif "if-modified-since" in request.headers:
+        try:
+            if int(stat.st_mtime) <= parsedate_to_datetime(request.headers["if-modified-since"]).timestamp():
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    # Range-запросы обрабатывает сам FileResponse
+    return FileResponse(path, headers=headers, filename=filename, media_type=media_type)
+
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
 
 def verify_password(plain: str, hashed: str) -> bool:
     return bcrypt.checkpw(plain.encode(), hashed.encode())
 
+# Пул живет все время работы процесса: lifespan может запускаться несколько раз (тесты, перезапуск приложения)
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="password")
+_password_jobs = {"pending": 0}
+_password_jobs_lock = threading.Lock()
+
+def run_password_job(func, *args):
+    """Хеширование и проверка пароля в ограниченном пуле.
+
+    Вызывается из синхронных обработчиков (они работают в пуле потоков FastAPI):
+    одновременно считается не больше PASSWORD_WORKERS bcrypt, а очередь сверх
+    PASSWORD_QUEUE_LIMIT получает 503 вместо бесконечного ожидания.
+    """
+    with _password_jobs_lock:
+        if _password_jobs["pending"] >= PASSWORD_QUEUE_LIMIT:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many authentication requests, retry later",
+                headers={"Retry-After": "1"}
+            )
+        _password_jobs["pending"] += 1
+    try:
+        return _password_pool.submit(func, *args).result()
+    finally:
+        with _password_jobs_lock:
+            _password_jobs["pending"] -= 1
+
+def load_session_secret() -> bytes:
+    # Ключ хранится в db.json, чтобы токены переживали перезапуск сервера
+    config = load_config()
+    if "session_secret" not in config:
+        config["session_secret"] = secrets.token_hex(32)
+        with open(CONFIG_PATH, "w") as f:
+            json.dump(config, f)
+    return bytes.fromhex(config["session_secret"])
+
+session_secret = load_session_secret()
+# Проверенные токены: токен -> (id пользователя, истекает), повторная проверка без HMAC и БД
+_sessions = {}
+
+def sign_session(user_id: int, expires: int, password_hash: str) -> str:
+    # Хеш пароля в подписи: после смены пароля старые токены недействительны
+    payload = f"{user_id}.{expires}.{password_hash}".encode()
+    return hmac.new(session_secret, payload, hashlib.sha256).hexdigest()
+
+def create_session_token(user: User) -> str:
+    expires = int(time.time()) + SESSION_TTL
+    token = f"{user.id}.{expires}.{sign_session(user.id, expires, user.password)}"
+    remember_session(token, user.id, expires)
+    return token
+
+def remember_session(token: str, user_id: int, expires: int):
+    if len(_sessions) >= SESSION_CACHE_LIMIT:
+        now = time.time()
+        for cached, (_, cached_expires) in list(_sessions.items()):
+            if cached_expires <= now:
+                _sessions.pop(cached, None)
+        if len(_sessions) >= SESSION_CACHE_LIMIT:
+            _sessions.clear()
+    _sessions[token] = (user_id, expires)
+
+def verify_session_token(db: Session, token: str) -> Optional[int]:
+    """id пользователя по токену или None. bcrypt здесь не участвует"""
+    cached = _sessions.get(token)
+    if cached is not None:
+        if cached[1] > time.time():
+            return cached[0]
+        _sessions.pop(token, None)
+        return None
+
+    try:
+        user_id, expires, signature = token.split(".")
+        user_id, expires = int(user_id), int(expires)
+    except ValueError:
+        return None
+    if expires <= time.time():
+        return None
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user or not hmac.compare_digest(signature, sign_session(user_id, expires, user.password)):
+        return None
+    remember_session(token, user_id, expires)
+    return user_id
+
+# Change log
+@event.listens_for(SessionLocal, "after_flush")
+def record_changes(session: Session, flush_context):
+    """Записывает ревизию для каждой изменённой строки синхронизируемых таблиц"""
+    entries = []
+    for obj in session.new:
+        if obj.__tablename__ in SYNC_TABLES:
+            entries.append({"table_name": obj.__tablename__, "row_id": obj.id, "operation": "upsert"})
+    for obj in session.dirty:
+        if obj.__tablename__ in SYNC_TABLES and session.is_modified(obj):
+            entries.append({"table_name": obj.__tablename__, "row_id": obj.id, "operation": "upsert"})
+    for obj in session.deleted:
+        if obj.__tablename__ in SYNC_TABLES:
+            entries.append({"table_name": obj.__tablename__, "row_id": obj.id, "operation": "delete"})
+    if any(entry["table_name"] == "roles" for entry in entries):
+        session.info["roles_changed"] = True
+    if any(entry["table_name"] == "users" for entry in entries):
+        session.info["users_changed"] = True
+    if entries:
+        connection = session.connection()
+        connection.execute(ChangeLog.__table__.insert(), entries)
+        # Опубликуем ревизию только после успешного коммита
+        session.info["revision"] = connection.execute(select(func.max(ChangeLog.id))).scalar()
+
+def record_bulk_changes(session: Session, table_name: str, row_ids, operation: str = "upsert"):
+    """Записывает ревизии для изменений в обход ORM (executemany, UPDATE по условию) - after_flush их не видит"""
+    if not row_ids:
+        return
+    connection = session.connection()
+    connection.execute(
+        ChangeLog.__table__.insert(),
+        [{"table_name": table_name, "row_id": row_id, "operation": operation} for row_id in row_ids]
+    )
+    session.info["revision"] = connection.execute(select(func.max(ChangeLog.id))).scalar()
+
+@event.listens_for(SessionLocal, "after_commit")
+def publish_revision(session: Session):
+    revision = session.info.pop("revision", None)
+    if revision is not None:
+        set_cached_revision(revision)
+        schedule_snapshot()
+    if session.info.pop("roles_changed", False):
+        _role_names.clear()
+    if session.info.pop("users_changed", False):
+        # Удаленный пользователь или смена пароля: токены проверятся по БД заново
+        _sessions.clear()
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def discard_revision(session: Session, previous_transaction):
+    session.info.pop("revision", None)
+    session.info.pop("roles_changed", None)
+    session.info.pop("users_changed", None)
+
+def get_revision(db: Session) -> int:
+    return db.query(func.max(ChangeLog.id)).scalar() or 0
+
+# Текущая ревизия БД в памяти, чтобы /db_hash не ходил в базу на каждый запрос.
+# Свои коммиты обновляют ее сразу; записи других процессов (второй воркер uvicorn,
+# alembic, замена файла БД) видны не позже чем через REVISION_CACHE_TTL
+REVISION_CACHE_TTL = 1.0  # секунды
+_revision_lock = threading.Lock()
+_cached_revision = {"value": None, "checked_at": 0.0}
+
+def set_cached_revision(revision: int):
+    with _revision_lock:
+        if _cached_revision["value"] is None or revision > _cached_revision["value"]:
+            _cached_revision["value"] = revision
+
+def get_cached_revision(db: Session) -> int:
+    if _cached_revision["value"] is None or time.monotonic() - _cached_revision["checked_at"] > REVISION_CACHE_TTL:
+        # MAX(id) по первичному ключу - один переход по индексу
+        revision = get_revision(db)
+        with _revision_lock:
+            # Значение из БД главнее: после замены файла ревизия может и уменьшиться
+            _cached_revision["value"] = revision
+            _cached_revision["checked_at"] = time.monotonic()
+    return _cached_revision["value"]
+
+# Снимки БД для планшетов: back-<ревизия>.db, собираются после серии записей
+_snapshot_lock = threading.Lock()
+_snapshot_timer_lock = threading.Lock()
+_snapshot_timer = {"value": None}
+
+def get_snapshot_path(revision: int) -> str:
+    return os.path.join(SNAPSHOTS_DIR, f"back-{revision}.db")
+
+def build_snapshot():
+    """Копирует back.db через backup API и возвращает (ревизия, путь к снимку).
+
+    Копия делается в одной читающей транзакции, поэтому согласована даже при
+    параллельной записи и включает страницы, еще не перенесенные из WAL.
+    """
+    with _snapshot_lock:
+        tmp_path = os.path.join(SNAPSHOTS_DIR, "back.db.tmp")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        target = sqlite3.connect(tmp_path)
+        try:
+            with engine.connect() as conn:
+                conn.connection.driver_connection.backup(target)
+            # Снимок - самостоятельный файл без -wal
+            target.execute("PRAGMA journal_mode = DELETE")
+            revision = target.execute("SELECT COALESCE(MAX(id), 0) FROM change_log").fetchone()[0]
+        finally:
+            target.close()
+
+        path = get_snapshot_path(revision)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+            compress_snapshot(path)
+            logger.info(f"Database snapshot for revision {revision} created")
+        prune_snapshots()
+        return revision, path
+
+def compress_snapshot(path: str):
+    """Сжимает снимок один раз при сборке, а не на каждый запрос"""
+    for encoding, (suffix, level) in SNAPSHOT_ENCODINGS.items():
+        if encoding == "zstd" and zstandard is None:
+            continue
+        tmp_path = path + suffix + ".tmp"
+        try:
+            with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+                if encoding == "zstd":
+                    zstandard.ZstdCompressor(level=level).copy_stream(src, dst)
+                else:
+                    with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=level, mtime=0) as gz:
+                        shutil.copyfileobj(src, gz, UPLOAD_CHUNK_SIZE)
+            os.replace(tmp_path, path + suffix)
+        except OSError as e:
+            logger.error(f"Snapshot compression ({encoding}) failed: {e}")
+
+def prune_snapshots():
+    revisions = defaultdict(list)
+    for name in os.listdir(SNAPSHOTS_DIR):
+        match = re.fullmatch(r"back-(\d+)\.db(\.gz|\.zst)?", name)
+        if match:
+            revisions[int(match.group(1))].append(name)
+    for revision in sorted(revisions)[:-SNAPSHOT_KEEP]:
+        for name in revisions[revision]:
+            try:
+                os.remove(os.path.join(SNAPSHOTS_DIR, name))
+            except OSError:
+                # Файл еще отдается клиенту - удалим при следующей сборке
+                pass
+
+def latest_snapshot_revision() -> Optional[int]:
+    revisions = [
+        int(match.group(1))
+        for match in (re.fullmatch(r"back-(\d+)\.db", name) for name in os.listdir(SNAPSHOTS_DIR))
+        if match
+    ]
+    return max(revisions, default=None)
+
+def get_change_log_floor(db: Session) -> int:
+    floor = db.get(SyncMeta, "change_log_floor")
+    return floor.value if floor else 0
+
+def compact_change_log(floor: int):
+    """Сжимает журнал до ревизии floor: по каждой строке остается последняя запись, удаления отбрасываются.
+
+    Клиент с ревизией не меньше floor синхронизируется как раньше; более старым /sync
+    отвечает reset, и они скачивают снимок. Последняя запись журнала не удаляется никогда,
+    иначе SQLite выдал бы ее id следующей ревизии повторно.
+    """
+    with engine.begin() as conn:
+        current = conn.execute(select(SyncMeta.value).where(SyncMeta.key == "change_log_floor")).scalar() or 0
+        latest = conn.execute(select(func.max(ChangeLog.id))).scalar() or 0
+        # Снимок новее журнала остался от замененной базы - сжимать по нему нельзя
+        if floor <= current or floor > latest:
+            return
+        superseded = conn.exec_driver_sql(
+            "DELETE FROM change_log WHERE id <= ? AND id NOT IN "
+            "(SELECT MAX(id) FROM change_log GROUP BY table_name, row_id)", (floor,)
+        ).rowcount
+        tombstones = conn.exec_driver_sql(
+            "DELETE FROM change_log WHERE id <= ? AND operation = 'delete' "
+            "AND id < (SELECT MAX(id) FROM change_log)", (floor,)
+        ).rowcount
+        conn.exec_driver_sql(
+            "INSERT INTO sync_meta (key, value) VALUES ('change_log_floor', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (floor,)
+        )
+    logger.info(f"Change log compacted up to revision {floor}: removed {superseded + tombstones} entries")
+
+def choose_snapshot_encoding(request: Request, path: str) -> Optional[str]:
+    """Лучшее сжатие, которое принимает клиент и для которого есть готовый файл"""
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in request.headers.get("accept-encoding", "").split(",")
+    }
+    for encoding, (suffix, _) in SNAPSHOT_ENCODINGS.items():
+        if encoding in accepted and os.path.exists(path + suffix):
+            return encoding
+    return None
+
+def get_snapshot(revision: int):
+    path = get_snapshot_path(revision)
+    if os.path.exists(path):
+        return revision, path
+    return build_snapshot()
+
+def _build_scheduled_snapshot():
+    try:
+        build_snapshot()
+    except Exception as e:
+        logger.error(f"Database snapshot failed: {e}")
+
+def schedule_snapshot():
+    """Откладывает сборку снимка, чтобы серия записей дала один снимок"""
+    with _snapshot_timer_lock:
+        if _snapshot_timer["value"] is not None:
+            _snapshot_timer["value"].cancel()
+        timer = threading.Timer(SNAPSHOT_DELAY, _build_scheduled_snapshot)
+        timer.daemon = True
+        timer.start()
+        _snapshot_timer["value"] = timer
+
+def fetch_raw_rows(db: Session, table_name: str, row_ids: List[int]) -> List[dict]:
+    # Значения отдаются в том же виде, в каком лежат в back.db
+    rows = []
+    for start in range(0, len(row_ids), 500):
+        chunk = row_ids[start:start + 500]
+        placeholders = ", ".join("?" * len(chunk))
+        result = db.connection().exec_driver_sql(
+            f"SELECT * FROM {table_name} WHERE id IN ({placeholders})", tuple(chunk)
+        )
+        rows.extend(dict(row) for row in result.mappings())
+    return rows
+
 # Database dependencies
+def parse_int_cell(value):
+    # Excel отдает числа как float, CSV - строками с пробелами между разрядами
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError
+        return int(value)
+    if isinstance(value, int):
+        return value
+    return int(str(value).replace("\u00a0", "").replace(" ", ""))
+
+def read_table_rows(upload: UploadFile, encoding: str):
+    """Построчно читает XLSX или CSV без загрузки файла в память.
+
+    Отдает (номер строки в файле, словарь колонка -> значение), пустые строки пропускаются.
+    """
+    filename = (upload.filename or "").lower()
+    if filename.endswith(".xlsx"):
+        if openpyxl is None:
+            raise HTTPException(status_code=400, detail="XLSX import is not available, upload CSV")
+        try:
+            workbook = openpyxl.load_workbook(upload.file, read_only=True, data_only=True)
+        except Exception:
+            raise HTTPException(status_code=400, detail="File is not a valid XLSX workbook")
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            yield from _rows_with_header(rows)
+        finally:
+            workbook.close()
+    elif filename.endswith(".csv"):
+        stream = io.TextIOWrapper(upload.file, encoding=encoding, newline="")
+        try:
+            sample = stream.read(4096)
+            stream.seek(0)
+            try:
+                # Excel с русской локалью сохраняет CSV через точку с запятой
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            yield from _rows_with_header(csv.reader(stream, dialect))
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail=f"File is not valid {encoding} text")
+        finally:
+            stream.detach()  # файл закроет сам UploadFile
+    else:
+        raise HTTPException(status_code=400, detail="Only .xlsx and .csv files are supported")
+
+def _rows_with_header(rows):
+    header = next(rows, None)
+    if header is None:
+        raise HTTPException(status_code=400, detail="File is empty")
+    columns = [str(name).strip().lower() if name is not None else "" for name in header]
+    for number, values in enumerate(rows, start=2):
+        if all(value is None or str(value).strip() == "" for value in values):
+            continue
+        yield number, dict(zip(columns, values))
+
+def iter_batches(rows, size: int):
+    """Списки по size элементов из итератора, не читая его дальше текущей пачки"""
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def validate_import_rows(db: Session, rows, default_category_id: Optional[int], categories: dict):
+    """Проверяет пачку строк импорта по правилам POST /items.
+
+    categories - кэш на весь импорт: id -> (Category или None, есть ли подкатегории);
+    на пачку загружаются только новые id, двумя запросами.
+    Возвращает (строки для вставки, ошибки, id категорий DEFAULT, которые станут ITEMS).
+    """
+    def category_of(row):
+        value = row.get("category_id")
+        if value is None or str(value).strip() == "":
+            return default_category_id
+        try:
+            return parse_int_cell(value)
+        except ValueError:
+            return None
+
+    new_ids = sorted({category_of(row) for _, row in rows} - {None} - categories.keys())
+    if new_ids:
+        found = {category.id: category for category in db.query(Category).filter(Category.id.in_(new_ids))}
+        with_children = {
+            parent_id for (parent_id,) in
+            db.query(Category.parent_id).filter(Category.parent_id.in_(new_ids)).distinct()
+        }
+        for category_id in new_ids:
+            categories[category_id] = (found.get(category_id), category_id in with_children)
+
+    valid, errors, filled_defaults = [], [], set()
+    for number, row in rows:
+        category, has_children = categories.get(category_of(row), (None, False))
+        problems = []
+        if category is None:
+            problems.append("category not found")
+        elif category.content_type == ContentType.CATEGORIES:
+            problems.append("category contains only subcategories")
+        elif category.content_type == ContentType.DEFAULT and has_children:
+            problems.append("category already contains subcategories")
+
+        name = str(row.get("name") or "").strip()
+        if not name:
+            problems.append("name is required")
+
+        prices = {}
+        for field in ("cost_price", "selling_price"):
+            try:
+                prices[field] = parse_int_cell(row.get(field))
+            except (TypeError, ValueError):
+                problems.append(f"{field} must be an integer")
+
+        mic = row.get("mic")
+        try:
+            mic = 0 if mic is None or str(mic).strip() == "" else parse_int_cell(mic)
+        except ValueError:
+            mic = None
+        if mic not in (0, 1):
+            problems.append("mic must be 0 or 1")
+
+        if problems:
+            errors.append({"row": number, "detail": "; ".join(problems)})
+            continue
+
+        if category.content_type == ContentType.DEFAULT:
+            filled_defaults.add(category.id)
+        image_id = str(row.get("image_id") or "").strip()
+        valid.append({
+            "name": name,
+            "category_id": category.id,
+            "parameter_value": str(row.get("parameter_value") or "").strip(),
+            "unit": str(row.get("unit") or "").strip() or category.unit,
+            "cost_price": prices["cost_price"],
+            "selling_price": prices["selling_price"],
+            "mic": mic,
+            "image_id": image_id or None,
+        })
+    return valid, errors, filled_defaults
+
+def iter_export_rows(category_id: Optional[int], subtree: bool):
+    """Строки выгрузки товаров порциями по EXPORT_BATCH_SIZE из отдельного соединения"""
+    where, params = "", {}
+    if category_id is not None:
+        where = (
+            "WHERE items.category_id IN (SELECT descendant FROM category_closure WHERE ancestor = :category_id)"
+            if subtree else "WHERE items.category_id = :category_id"
+        )
+        params["category_id"] = category_id
+    # Сессия запроса закрывается раньше, чем отдан поток, поэтому соединение свое
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=EXPORT_BATCH_SIZE).execute(text(f"""
+            SELECT items.id, items.name, items.category_id, categories.name, items.parameter_value,
+                   items.unit, items.cost_price, items.selling_price, items.mic, items.image_id
+            FROM items LEFT JOIN categories ON categories.id = items.category_id
+            {where}
+            ORDER BY items.id
+        """), params)
+        yield from result
+
+def stream_items_csv(rows):
+    buffer = io.StringIO()
+    # BOM нужен Excel, чтобы открыть UTF-8 без мастера импорта
+    buffer.write("\ufeff")
+    writer = csv.writer(buffer)
+    writer.writerow(ITEM_EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= UPLOAD_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def write_items_xlsx(rows) -> str:
+    # write_only пишет строки на диск по мере добавления, книга целиком в памяти не держится
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("items")
+    sheet.append(ITEM_EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append(list(row))
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    workbook.save(path)
+    return path
+
 def get_db():
     db = SessionLocal()
     try:
@@ -240,6 +1248,13 @@ def get_db():
     finally:
         db.close()
 
+def get_current_user_id(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)) -> int:
+    scheme, _, token = (authorization or "").partition(" ")
+    user_id = verify_session_token(db, token) if scheme.lower() == "bearer" else None
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session", headers={"WWW-Authenticate": "Bearer"})
+    return user_id
+
 # Service functions
 def get_user_by_username(db: Session, username: str) -> User:
     return db.query(User).filter(User.username == username).first()
@@ -247,23 +1262,42 @@ def get_user_by_username(db: Session, username: str) -> User:
 def get_role_by_id(db: Session, role_id: int) -> Role:
     return db.query(Role).filter(Role.id == role_id).first()
 
+# Кеш имен ролей, сбрасывается после коммита с изменениями в roles
+_role_names = {}
+
+def get_role_name(db: Session, role_id: Optional[int]) -> Optional[str]:
+    if role_id is None:
+        return None
+    if role_id not in _role_names:
+        role = get_role_by_id(db, role_id)
+        if not role:
+            return None
+        _role_names[role_id] = role.name
+    return _role_names[role_id]
+
 def get_category_by_id(db: Session, category_id: int) -> Category:
     return db.query(Category).filter(Category.id == category_id).first()
 
+def subtree_ids(category_id: int):
+    """Подзапрос с id категории и всех ее потомков"""
+    return select(CategoryClosure.descendant).where(CategoryClosure.ancestor == category_id)
+
 def get_item_by_id(db: Session, item_id: int) -> Item:
     return db.query(Item).filter(Item.id == item_id).first()
 
 # API endpoints
 @app.post("/register", response_model=UserResponse)
-async def register(user: UserRegister, db: Session = Depends(get_db)):
+def register(user: UserRegister, db: Session = Depends(get_db)):
     if get_user_by_username(db, user.username):
         raise HTTPException(status_code=400, detail="Username already registered")
 
-    role = get_role_by_id(db, user.role_id)
-    if not role:
+    role_name = get_role_name(db, user.role_id)
+    if not role_name:
         raise HTTPException(status_code=400, detail="Role does not exist")
 
-    hashed_password = pwd_context.hash(user.password)
+    # Соединение не держим, пока запрос ждет пул bcrypt: иначе всплеск входов исчерпает пул соединений
+    db.rollback()
+    hashed_password = run_password_job(pwd_context.hash, user.password)
     new_user = User(
         username=user.username,
         password=hashed_password,
@@ -279,7 +1313,7 @@ async def register(user: UserRegister, db: Session = Depends(get_db)):
         "id": new_user.id,
         "username": new_user.username,
         "full_name": new_user.full_name,
-        "role": role.name
+        "role": role_name
     }
 
 #################################User endpoints##############################################
@@ -287,67 +1321,72 @@ async def register(user: UserRegister, db: Session = Depends(get_db)):
 @app.post("/login")
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = get_user_by_username(db, form_data.username)
+    # Соединение возвращаем в пул до bcrypt; close, а не rollback - загруженный user не должен истечь
+    db.close()
 
-    if not user or not pwd_context.verify(form_data.password, user.password):
+    if not user or not run_password_job(pwd_context.verify, form_data.password, user.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    if user.username == "admin" and not os.path.exists(CONFIG_PATH):
+    # db.json теперь хранит и ключ сессий, поэтому проверяем сам путь к БД
+    if user.username == "admin" and "db_file_path" not in load_config():
         save_db_path(DEFAULT_DB_PATH)
         logger.info("Created default config for admin user")
 
-    return {"message": "Login successful", "user_id": user.id}
+    return {
+        "message": "Login successful",
+        "user_id": user.id,
+        "token": create_session_token(user),
+        "expires_in": SESSION_TTL
+    }
+
+@app.get("/session", response_model=UserResponse)
+def get_session(user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    """Пользователь текущей сессии по заголовку Authorization: Bearer <token>"""
+    return get_user(user_id, db)
 
 @app.get("/users", response_model=List[UserResponse])
 def get_users(db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    result = []
-    for user in users:
-        role = get_role_by_id(db, user.role_id)
-        result.append({
+    # Роли подгружаются тем же запросом, без отдельного SELECT на каждого пользователя
+    users = db.query(User).options(joinedload(User.role)).all()
+    return [
+        {
             "id": user.id,
             "username": user.username,
             "full_name": user.full_name,
-            "role": role.name if role else None
-        })
-    return result
+            "role": user.role.name if user.role else None
+        }
+        for user in users
+    ]
 
 @app.get("/users/{user_id}", response_model=UserResponse)
 def get_user(user_id: int, db: Session = Depends(get_db)):
     db_user = db.query(User).filter(User.id == user_id).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
-    role = get_role_by_id(db, db_user.role_id)
     return {
         "id": db_user.id,
         "username": db_user.username,
         "full_name": db_user.full_name,
-        "role": role.name if role else None
+        "role": get_role_name(db, db_user.role_id)
     }
 
 @app.put("/users/{user_id}", response_model=UserResponse)
 def update_user(user_id: int, user: UserUpdate, db: Session = Depends(get_db)):
+    update_data = user.model_dump(exclude_unset=True)
+    # Хешируем до обращения к БД, чтобы не держать соединение во время bcrypt
+    if "password" in update_data:
+        update_data["password"] = run_password_job(pwd_context.hash, update_data["password"])
+
     db_user = db.query(User).filter(User.id == user_id).first()
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    current_data = {
-        "id": db_user.id,
-        "username": db_user.username,
-        "full_name": db_user.full_name,
-        "role": get_role_by_id(db, db_user.role_id).name if db_user.role_id else None
-    }
-
-    update_data = user.model_dump(exclude_unset=True)
-
     if "username" in update_data:
         existing_user = get_user_by_username(db, update_data["username"])
         if existing_user and existing_user.id != user_id:
             raise HTTPException(status_code=400, detail="Username already exists")
 
-    if "password" in update_data:
-        update_data["password"] = pwd_context.hash(update_data["password"])
-
-    if "role_id" in update_data and not get_role_by_id(db, update_data["role_id"]):
+    if "role_id" in update_data and not get_role_name(db, update_data["role_id"]):
         raise HTTPException(status_code=400, detail="Role does not exist")
 
     for key, value in update_data.items():
@@ -356,12 +1395,11 @@ def update_user(user_id: int, user: UserUpdate, db: Session = Depends(get_db)):
     db.commit()
     db.refresh(db_user)
 
-    role = get_role_by_id(db, db_user.role_id)
     return {
         "id": db_user.id,
         "username": db_user.username,
         "full_name": db_user.full_name,
-        "role": role.name if role else None
+        "role": get_role_name(db, db_user.role_id)
     }
 
 @app.delete("/users/{user_id}")
@@ -423,6 +1461,9 @@ def delete_role(role_id: int, db: Session = Depends(get_db)):
 
     if not role:
         raise HTTPException(status_code=404, detail="Role not found")
+    # С foreign_keys = ON удаление назначенной роли нарушило бы ссылку из users
+    if db.query(User.id).filter(User.role_id == role_id).first():
+        raise HTTPException(status_code=400, detail="Role is assigned to users")
 
     db.delete(role)
     db.commit()
@@ -471,12 +1512,16 @@ def create_category(category: CategoryCreate, db: Session = Depends(get_db)):
     
     return new_category
 
-@app.get("/categories", response_model=List[CategoryResponse])
+@app.get("/categories", response_model=Union[CategoryPage, List[CategoryResponse]])
 def get_categories(
     parent_id: Optional[int] = None, 
     tab: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db)
 ):
+    """Категории вкладки или родителя. С limit - страницы по курсору after_id в том же
+    порядке (group, position), что и полный список"""
     query = db.query(Category)
     
     # Основной фильтр по tab
@@ -493,10 +1538,15 @@ def get_categories(
     if tab is not None and parent_id is None:
         query = query.filter(Category.tab == tab, Category.parent_id == None)
     
-    categories = query.options(
+    query = query.options(
         joinedload(Category.children),
         joinedload(Category.items)
-    ).order_by(Category.group, Category.position).all()
+    )
+    next_cursor = None
+    if limit is not None:
+        categories, next_cursor = paginate_categories(db, query, after_id, limit)
+    else:
+        categories = query.order_by(Category.group, Category.position, Category.id).all()
     
     result = []
     for cat in categories:
@@ -541,8 +1591,63 @@ def get_categories(
         )
         result.append(category_response)
     
+    if limit is not None:
+        return CategoryPage(items=result, next_cursor=next_cursor)
     return result
 
+@app.get("/categories/tree", response_model=List[CategoryTreeNode])
+def get_category_tree(
+    tab: Optional[int] = None,
+    with_counts: bool = True,
+    db: Session = Depends(get_db)
+):
+    query = db.query(Category)
+    if tab is not None:
+        query = query.filter(Category.tab == tab)
+    categories = query.order_by(Category.group, Category.position).all()
+
+    counts = {}
+    total_counts = {}
+    if with_counts:
+        counts_query = db.query(Item.category_id, func.count(Item.id))
+        # Товары поддерева - один join по таблице замыкания вместо обхода дерева
+        total_query = db.query(CategoryClosure.ancestor, func.count(Item.id)).join(
+            Item, Item.category_id == CategoryClosure.descendant
+        )
+        if tab is not None:
+            counts_query = counts_query.join(Category, Item.category_id == Category.id).filter(Category.tab == tab)
+            total_query = total_query.join(Category, CategoryClosure.ancestor == Category.id).filter(Category.tab == tab)
+        counts = dict(counts_query.group_by(Item.category_id).all())
+        total_counts = dict(total_query.group_by(CategoryClosure.ancestor).all())
+
+    # Сборка дерева за один проход: узлы по id, затем привязка к родителям
+    nodes = {}
+    for cat in categories:
+        nodes[cat.id] = {
+            "id": cat.id,
+            "name": cat.name,
+            "group": cat.group,
+            "position": cat.position,
+            "parameter": cat.parameter,
+            "unit": cat.unit,
+            "tab": cat.tab,
+            "parent_id": cat.parent_id,
+            "content_type": cat.content_type,
+            "item_count": counts.get(cat.id, 0) if with_counts else None,
+            "total_item_count": total_counts.get(cat.id, 0) if with_counts else None,
+            "children": []
+        }
+
+    roots = []
+    for cat in categories:
+        parent = nodes.get(cat.parent_id)
+        if parent is not None:
+            parent["children"].append(nodes[cat.id])
+        else:
+            roots.append(nodes[cat.id])
+
+    return roots
+
 @app.get("/categories/{category_id}", response_model=CategoryResponse)
 def get_category(category_id: int, db: Session = Depends(get_db)):
     db_category = db.query(Category).filter(Category.id == category_id).first()
@@ -589,6 +1694,16 @@ def get_category(category_id: int, db: Session = Depends(get_db)):
         items=items_data
     )
 
+@app.get("/categories/{category_id}/path", response_model=List[CategoryPathEntry])
+def get_category_path(category_id: int, db: Session = Depends(get_db)):
+    """Цепочка категорий от корня до запрошенной - для хлебных крошек"""
+    path = db.query(Category.id, Category.name, Category.parent_id, CategoryClosure.depth).join(
+        CategoryClosure, CategoryClosure.ancestor == Category.id
+    ).filter(CategoryClosure.descendant == category_id).order_by(CategoryClosure.depth.desc()).all()
+    if not path:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return path
+
 @app.put("/categories/{category_id}", response_model=CategoryResponse)
 def update_category(category_id: int, category: CategoryUpdate, db: Session = Depends(get_db)):
     db_category = db.query(Category).filter(Category.id == category_id).first()
@@ -605,15 +1720,42 @@ def update_category(category_id: int, category: CategoryUpdate, db: Session = De
     if "tab" in update_data and update_data["tab"] < 0:
         raise HTTPException(status_code=400, detail="tab must be positive number")
 
-    if "name" in update_data:
+    # Имя должно быть уникальным в том родителе, где категория окажется после изменения
+    target_parent_id = update_data.get("parent_id", db_category.parent_id)
+    if "name" in update_data or target_parent_id != db_category.parent_id:
         existing_category = db.query(Category).filter(
-            Category.name == update_data["name"],
-            Category.parent_id == db_category.parent_id,
+            Category.name == update_data.get("name", db_category.name),
+            Category.parent_id == target_parent_id,
             Category.id != category_id
         ).first()
         if existing_category:
             raise HTTPException(status_code=400, detail="Category name already exists in this parent")
 
+    new_parent = None
+    if "parent_id" in update_data and update_data["parent_id"] != db_category.parent_id:
+        if update_data["parent_id"] is not None:
+            new_parent = get_category_by_id(db, update_data["parent_id"])
+            if not new_parent:
+                raise HTTPException(status_code=404, detail="Parent category not found")
+            in_subtree = db.query(CategoryClosure).filter(
+                CategoryClosure.ancestor == category_id,
+                CategoryClosure.descendant == new_parent.id
+            ).first()
+            if in_subtree:
+                raise HTTPException(status_code=400, detail="Cannot move category into its own subtree")
+            if new_parent.content_type == ContentType.ITEMS or (
+                new_parent.content_type == ContentType.DEFAULT and new_parent.items
+            ):
+                raise HTTPException(status_code=400, detail="Parent category cannot contain subcategories")
+
+    # Подкатегория всегда во вкладке родителя; при переносе в другую вкладку tab меняется у всего поддерева
+    target_tab = update_data.get("tab", db_category.tab)
+    if target_parent_id is not None:
+        parent_tab = new_parent.tab if new_parent is not None else db_category.parent.tab
+        if "tab" in update_data and update_data["tab"] != parent_tab:
+            raise HTTPException(status_code=400, detail="Subcategory tab must match its parent")
+        target_tab = parent_tab
+
     if "content_type" in update_data:
         if update_data["content_type"] != db_category.content_type:
             if update_data["content_type"] == ContentType.ITEMS and db_category.children:
@@ -632,8 +1774,18 @@ def update_category(category_id: int, category: CategoryUpdate, db: Session = De
                     detail="Cannot change to default content type when category has content"
                 )
 
+    tab_changed = target_tab != db_category.tab
     for key, value in update_data.items():
         setattr(db_category, key, value)
+    if new_parent is not None and new_parent.content_type == ContentType.DEFAULT:
+        new_parent.content_type = ContentType.CATEGORIES
+    if tab_changed:
+        # Через ORM, чтобы after_flush записал ревизии для каждой перенесенной категории
+        subtree = db.query(Category).filter(
+            Category.id.in_(subtree_ids(category_id)), Category.tab != target_tab
+        )
+        for node in subtree:
+            node.tab = target_tab
 
     db.commit()
     db.refresh(db_category)
@@ -685,16 +1837,224 @@ def create_item(item: ItemCreate, db: Session = Depends(get_db)):
     
     return new_item
 
-@app.get("/items/search", response_model=List[ItemResponse])
-def search_items(query: str, db: Session = Depends(get_db)):
-    return db.query(Item).filter(Item.name.contains(query)).all()
+@app.post("/items/import")
+def import_items(
+    file: UploadFile = File(...),
+    category_id: Optional[int] = None,
+    encoding: str = "utf-8-sig",
+    db: Session = Depends(get_db)
+):
+    """Добавляет товары из XLSX/CSV. category_id задает категорию для строк без своей.
+
+    Файл читается и вставляется пачками по IMPORT_BATCH_SIZE строк в одной транзакции и
+    принимается целиком или не принимается: при ошибках в строках транзакция откатывается.
+    """
+    connection = db.connection()
+    categories, item_ids, errors, filled_defaults = {}, [], [], set()
+    error_count = row_count = 0
+    for rows in iter_batches(read_table_rows(file, encoding), IMPORT_BATCH_SIZE):
+        row_count += len(rows)
+        if row_count > MAX_IMPORT_ROWS:
+            db.rollback()
+            raise HTTPException(status_code=413, detail=f"Import is limited to {MAX_IMPORT_ROWS} rows")
+        valid, batch_errors, batch_defaults = validate_import_rows(db, rows, category_id, categories)
+        error_count += len(batch_errors)
+        errors.extend(batch_errors[:MAX_IMPORT_ERRORS - len(errors)])
+        filled_defaults |= batch_defaults
+        # После первой ошибки файл уже не будет принят: дальше только собираем ошибки
+        if valid and not error_count:
+            # id берутся из RETURNING, а не вычисляются: журнал должен ссылаться на реальные строки
+            item_ids.extend(connection.execute(Item.__table__.insert().returning(Item.id), valid).scalars())
+
+    if error_count:
+        db.rollback()
+        raise HTTPException(status_code=400, detail={
+            "message": f"{error_count} rows failed validation, nothing was imported",
+            "errors": errors
+        })
+    if not item_ids:
+        return {"imported": 0, "revision": get_cached_revision(db)}
+
+    # Как и POST /items: категория DEFAULT с товарами становится ITEMS
+    filled_defaults = sorted(filled_defaults)
+    for start in range(0, len(filled_defaults), IMPORT_BATCH_SIZE):
+        connection.execute(
+            Category.__table__.update()
+            .where(Category.id.in_(filled_defaults[start:start + IMPORT_BATCH_SIZE]))
+            .values(content_type=ContentType.ITEMS)
+        )
+    record_bulk_changes(db, "categories", filled_defaults)
+    record_bulk_changes(db, "items", item_ids)
+    revision = db.info["revision"]
+    db.commit()
+    return {"imported": len(item_ids), "revision": revision}
+
+@app.post("/items/bulk_update")
+def bulk_update_items(update: ItemBulkUpdate, db: Session = Depends(get_db)):
+    """Массовое изменение товаров одной транзакцией.
+
+    Правило выполняется одним UPDATE по поддереву категории, patches - executemany
+    по группам с одинаковым набором полей.
+    """
+    if (update.patches is None) == (update.rule is None):
+        raise HTTPException(status_code=400, detail="Provide either patches or rule")
+
+    connection = db.connection()
+    if update.rule is not None:
+        rule = update.rule
+        # Правило без области не должно молча переоценить весь каталог
+        if (rule.category_id is not None) + (rule.ids is not None) + rule.all != 1:
+            raise HTTPException(status_code=400, detail="Rule needs exactly one scope: category_id, ids or all")
+        params = {"factor": 1 + rule.percent / 100, "amount": rule.amount, "round_to": rule.round_to}
+
+        def reprice(where, **scope_params):
+            # field ограничен Literal, подставлять в запрос безопасно
+            statement = text(f"""
+                UPDATE items
+                SET {rule.field} = MAX(0, CAST(ROUND(({rule.field} * :factor + :amount) / :round_to) * :round_to AS INTEGER))
+                {where}
+                RETURNING id
+            """)
+            if "ids" in scope_params:
+                statement = statement.bindparams(bindparam("ids", expanding=True))
+            return [row_id for (row_id,) in connection.execute(statement, {**params, **scope_params})]
+
+        if rule.category_id is not None:
+            if not get_category_by_id(db, rule.category_id):
+                raise HTTPException(status_code=404, detail="Category not found")
+            item_ids = reprice(
+                "WHERE category_id IN (SELECT descendant FROM category_closure WHERE ancestor = :category_id)"
+                if rule.subtree else "WHERE category_id = :category_id",
+                category_id=rule.category_id
+            )
+        elif rule.ids is not None:
+            requested = sorted(set(rule.ids))
+            item_ids = []
+            for start in range(0, len(requested), MAX_PAGE_SIZE):
+                item_ids.extend(reprice("WHERE id IN :ids", ids=requested[start:start + MAX_PAGE_SIZE]))
+            missing = sorted(set(requested) - set(item_ids))
+            if missing:
+                db.rollback()
+                raise HTTPException(status_code=404, detail={"message": "Items not found", "ids": missing[:MAX_IMPORT_ERRORS]})
+        else:
+            item_ids = reprice("")
+    else:
+        patches = [patch.model_dump(exclude_unset=True) for patch in update.patches]
+        if any(patch.get("mic") not in (None, 0, 1) for patch in patches):
+            raise HTTPException(status_code=400, detail="mic must be 0 or 1")
+        # Два изменения одного товара попали бы в одну группу, и победил бы порядок во входных данных
+        duplicates = sorted(row_id for row_id, count in Counter(patch["id"] for patch in patches).items() if count > 1)
+        if duplicates:
+            raise HTTPException(status_code=400, detail={
+                "message": "Duplicate item ids in patches", "ids": duplicates[:MAX_IMPORT_ERRORS]
+            })
+
+        requested = {patch["id"] for patch in patches}
+        existing = set()
+        ordered = sorted(requested)
+        for start in range(0, len(ordered), MAX_PAGE_SIZE):
+            chunk = ordered[start:start + MAX_PAGE_SIZE]
+            existing.update(row_id for (row_id,) in db.query(Item.id).filter(Item.id.in_(chunk)))
+        missing = sorted(requested - existing)
+        if missing:
+            raise HTTPException(status_code=404, detail={"message": "Items not found", "ids": missing[:MAX_IMPORT_ERRORS]})
+
+        groups = defaultdict(list)
+        for patch in patches:
+            fields = tuple(sorted(key for key in patch if key != "id"))
+            if fields:
+                groups[fields].append(patch)
+        for fields, group in groups.items():
+            connection.execute(
+                Item.__table__.update()
+                .where(Item.id == bindparam("item_id"))
+                .values({field: bindparam(field) for field in fields}),
+                [{**{field: patch[field] for field in fields}, "item_id": patch["id"]} for patch in group]
+            )
+        item_ids = sorted({patch["id"] for group in groups.values() for patch in group})
+
+    if not item_ids:
+        return {"updated": 0, "revision": get_cached_revision(db)}
+    # UPDATE мимо ORM: ревизии пишем сами, публикует их и планирует снимок after_commit
+    record_bulk_changes(db, "items", item_ids)
+    revision = db.info["revision"]
+    db.commit()
+    return {"updated": len(item_ids), "revision": revision}
+
+@app.get("/items/export")
+def export_items(
+    background_tasks: BackgroundTasks,
+    file_format: str = Query("csv", alias="format", pattern="^(csv|xlsx)$"),
+    category_id: Optional[int] = None,
+    subtree: bool = False
+):
+    rows = iter_export_rows(category_id, subtree)
+    if file_format == "csv":
+        return StreamingResponse(
+            stream_items_csv(rows),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="items.csv"'}
+        )
 
-@app.get("/items", response_model=List[ItemResponse])
-def get_items(category_id: Optional[int] = None, db: Session = Depends(get_db)):
+    if openpyxl is None:
+        raise HTTPException(status_code=400, detail="XLSX export is not available, use format=csv")
+    path = write_items_xlsx(rows)
+    background_tasks.add_task(os.remove, path)
+    return FileResponse(path, filename="items.xlsx", media_type=XLSX_MEDIA_TYPE)
+
+@app.get("/items/search", response_model=List[ItemResponse])
+def search_items(
+    query: str,
+    category_id: Optional[int] = None,
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    if not search_index_available:
+        fallback = db.query(Item).filter(Item.name.contains(query))
+        if category_id is not None:
+            fallback = fallback.filter(Item.category_id.in_(subtree_ids(category_id)))
+        return fallback.limit(limit).all()
+
+    match = build_search_query(query)
+    if not match:
+        return []
+
+    # Поиск можно ограничить поддеревом категории
+    subtree_filter = ""
+    params = {"match": match, "limit": limit}
+    if category_id is not None:
+        subtree_filter = """
+            AND items.category_id IN (SELECT descendant FROM category_closure WHERE ancestor = :category_id)
+        """
+        params["category_id"] = category_id
+
+    return db.query(Item).from_statement(text(f"""
+        SELECT items.* FROM items_fts
+        JOIN items ON items.id = items_fts.rowid
+        WHERE items_fts MATCH :match {subtree_filter}
+        ORDER BY {SEARCH_RANKING}
+        LIMIT :limit
+    """)).params(**params).all()
+
+@app.get("/items", response_model=Union[ItemPage, List[ItemResponse]])
+def get_items(
+    category_id: Optional[int] = None,
+    subtree: bool = False,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
     query = db.query(Item)
-    if category_id:
+    if category_id and subtree:
+        # Товары категории и всех вложенных
+        query = query.filter(Item.category_id.in_(subtree_ids(category_id)))
+    elif category_id:
         query = query.filter(Item.category_id == category_id)
-    return query.all()
+    # Без limit сохраняется прежний ответ - полный список
+    if limit is None:
+        return query.all()
+    items, next_cursor = paginate_by_id(query, Item.id, after_id, limit)
+    return ItemPage(items=items, next_cursor=next_cursor)
 
 @app.get("/items/{item_id}", response_model=ItemResponse)
 def get_item(item_id: int, db: Session = Depends(get_db)):
@@ -744,20 +2104,53 @@ def delete_item(item_id: int, db: Session = Depends(get_db)):
 #################################Image endpoints##############################################
 
 @app.post("/upload_image")
-def upload_image(image: UploadFile = File(...)):
-    return {"image_id": save_image(image)}
+def upload_image(background_tasks: BackgroundTasks, image: UploadFile = File(...)):
+    image_id = save_image(image)
+    background_tasks.add_task(generate_image_variants, image_id)
+    return {"image_id": image_id}
 
+@app.get("/imgs/manifest")
+def imgs_manifest():
+    if not os.path.exists(IMGS_DIR):
+        raise HTTPException(status_code=404, detail="Папка Imgs не найдена")
+
+    files = []
+    with os.scandir(IMGS_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".jpg") or not entry.is_file():
+                continue
+            stat = entry.stat()
+            files.append({
+                "id": entry.name[:-len(".jpg")],
+                "file": entry.name,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "hash": get_image_hash(entry.path, stat.st_size, stat.st_mtime)
+            })
+    return {"files": files}
 
 @app.get("/imgs/{image_id}")
-def get_image(image_id: str):
+def get_image(image_id: str, request: Request, background_tasks: BackgroundTasks, size: Optional[str] = None):
+    if size is not None and size not in IMAGE_SIZES:
+        raise HTTPException(status_code=400, detail=f"Unknown image size, expected one of: {', '.join(IMAGE_SIZES)}")
+
     image_path = os.path.join(IMGS_DIR, f"{image_id}.jpg")
 
     if not os.path.exists(image_path):
         if os.path.exists(DEFAULT_IMAGE_PATH):
-            return FileResponse(DEFAULT_IMAGE_PATH)
+            return cached_file_response(request, DEFAULT_IMAGE_PATH, immutable=False)
         raise HTTPException(status_code=404, detail="Image not found")
 
-    return FileResponse(image_path)
+    if size is not None:
+        variant_path = get_image_variant_path(image_id, size)
+        if os.path.exists(variant_path):
+            return cached_file_response(request, variant_path)
+        # Для изображений, загруженных до появления копий, создаем их в фоне
+        background_tasks.add_task(generate_image_variants, image_id)
+        # Пока копии нет, по этому адресу отдается оригинал - его нельзя кешировать навсегда
+        return cached_file_response(request, image_path, immutable=False)
+
+    return cached_file_response(request, image_path)
 
 #################################Files endpoint##############################################
 
@@ -773,24 +2166,76 @@ def list_imgs():
     return {"files": files}
 
 @app.get("/download_img/{image_id}")
-def download_img(image_id: str):
+def download_img(image_id: str, request: Request):
     img_path = os.path.join(IMGS_DIR, image_id)
     if not os.path.exists(img_path):
         if os.path.exists(DEFAULT_IMAGE_PATH):
-            return FileResponse(DEFAULT_IMAGE_PATH)
+            return cached_file_response(request, DEFAULT_IMAGE_PATH, immutable=False)
         raise HTTPException(status_code=404, detail="Image not found")
-    return FileResponse(img_path)
+    return cached_file_response(request, img_path)
 
 @app.get("/download_db")
-def download_db():
+def download_db(request: Request, db: Session = Depends(get_db)):
     if not os.path.exists(DEFAULT_DB_PATH):
         raise HTTPException(status_code=404, detail="Файл back.db не найден")
-    return FileResponse(DEFAULT_DB_PATH, filename="back.db")
+    # Отдается готовый снимок текущей ревизии, а не живой файл
+    revision, path = get_snapshot(get_cached_revision(db))
+    headers = {"Vary": "Accept-Encoding"}
+    etag = str(revision)
+    encoding = choose_snapshot_encoding(request, path)
+    if encoding:
+        path += SNAPSHOT_ENCODINGS[encoding][0]
+        headers["Content-Encoding"] = encoding
+        etag += f"-{encoding}"
+    return cached_file_response(
+        request, path,
+        immutable=False,
+        filename="back.db",
+        etag=etag,
+        headers=headers,
+        media_type="application/octet-stream"
+    )
+
+@app.get("/sync")
+def sync(since: int = 0, db: Session = Depends(get_db)):
+    revision = get_revision(db)
+    if since > revision or since < get_change_log_floor(db):
+        # Клиент видел ревизии, которых здесь нет (база была заменена), или журнал
+        # до его ревизии уже сжат и удаления потеряны - нужна полная загрузка
+        return {"revision": revision, "reset": True}
+
+    entries = db.query(ChangeLog.table_name, ChangeLog.row_id, ChangeLog.operation).filter(
+        ChangeLog.id > since,
+        ChangeLog.id <= revision
+    ).order_by(ChangeLog.id)
+
+    # Для каждой строки важна только последняя операция
+    latest = {}
+    for table_name, row_id, operation in entries:
+        latest[(table_name, row_id)] = operation
+
+    upserted = defaultdict(list)
+    deleted = defaultdict(list)
+    for (table_name, row_id), operation in latest.items():
+        if operation == "delete":
+            deleted[table_name].append(row_id)
+        else:
+            upserted[table_name].append(row_id)
+
+    return {
+        "revision": revision,
+        "reset": False,
+        "changed": {table: fetch_raw_rows(db, table, ids) for table, ids in upserted.items()},
+        "deleted": dict(deleted)
+    }
 
 @app.get("/db_hash")
-def get_db_hash():
-    with open(DEFAULT_DB_PATH, "rb") as f:
-        return hashlib.md5(f.read()).hexdigest()
+def get_db_hash(request: Request, db: Session = Depends(get_db)):
+    fingerprint = str(get_cached_revision(db))
+    etag = f'"{fingerprint}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(content=fingerprint, headers={"ETag": etag})
     
 @app.post("/upload_contract")
 async def upload_contract(file: UploadFile = File(...)):
@@ -1,7 +1,7 @@
 import flet as ft
 from plugins.theme_manager import create_theme_button
 from pages.home_page import home
-import requests
+import httpx
 import os
 import json
 import uvicorn
@@ -9,6 +9,7 @@ from backend.server import app, engine, init_db, Base
 import asyncio
 from plugins.apply_theme import apply_themes
 from plugins.network import API_URL
+from plugins.api_client import api, error_detail
 from urllib.parse import urlparse
 
 # Получаем путь к текущей директории, где находится этот скрипт
@@ -33,8 +34,8 @@ def login(page: ft.Page):
         user_pass.current.focus()
         page.update()
 
-    def ent_click_2(e):
-        btn_login.current.on_click(e)
+    async def ent_click_2(e):
+        await btn_login.current.on_click(e)
         page.update()
 
     # Функция валидации полей
@@ -43,7 +44,7 @@ def login(page: ft.Page):
         page.update()
 
     # Функция входа (логика авторизации)
-    def login(e):
+    async def login(e):
         # Проверяем, заполнены ли поля
         if not user_login.current.value or not user_pass.current.value:
             page.open(
@@ -66,38 +67,44 @@ def login(page: ft.Page):
             mechanic(page)  # Перенаправление после успешного входа
             return
 
-        # Отправка данных для авторизации через API
+        # Отправка данных для авторизации через общий асинхронный клиент: окно не замирает,
+        # пока сервер считает bcrypt, а таймаут клиента ограничивает ожидание
+        btn_login.current.disabled = True
+        page.update()
         try:
-            response = requests.post(f"{API_URL}/login", data={
+            response = await api.post("/login", data={
                 "username": user_login.current.value,
                 "password": user_pass.current.value
             })
-            if response.status_code == 200:
-                page.current_password = user_pass.current.value
-                # Успешная авторизация
-                page.open(
-                    ft.SnackBar(
-                        content=ft.Text("Успешный вход!"),
-                        bgcolor="green"
-                    )
-                )
-                mechanic(page)  # Перенаправление после успешного входа
-            else:
-                # Ошибка авторизации
-                page.open(
-                    ft.SnackBar(
-                        content=ft.Text("Ошибка: Неправильный логин или пароль."),
-                        bgcolor="red"
-                    )
-                )
-        except requests.exceptions.RequestException as ex:
-            # Обработка ошибок сети
+            page.current_password = user_pass.current.value
+            api.set_token(response.json().get("token"))
+            # Успешная авторизация
             page.open(
                 ft.SnackBar(
-                    content=ft.Text(f"Ошибка подключения: {ex}"),
-                    bgcolor="red"
+                    content=ft.Text("Успешный вход!"),
+                    bgcolor="green"
                 )
             )
+            mechanic(page)  # Перенаправление после успешного входа
+            return
+        except httpx.HTTPStatusError as ex:
+            if ex.response.status_code == 401:
+                message = "Ошибка: Неправильный логин или пароль."
+            elif ex.response.status_code == 503:
+                # Очередь проверки паролей на сервере заполнена
+                message = "Сервер занят, повторите вход через несколько секунд."
+            else:
+                message = f"Ошибка входа: {error_detail(ex)}"
+        except httpx.HTTPError as ex:
+            # Обработка ошибок сети и таймаута
+            message = f"Ошибка подключения: {error_detail(ex)}"
+        btn_login.current.disabled = False
+        page.open(
+            ft.SnackBar(
+                content=ft.Text(message),
+                bgcolor="red"
+            )
+        )
 
     # Функция для выбора файла
     def pick_file_result(e: ft.FilePickerResultEvent):
@@ -156,7 +163,7 @@ def login(page: ft.Page):
     btn_login_control = ft.OutlinedButton(
         text="Запуск... Ожидайте",
         width=300,
-        on_click=login,  # Синхронный обработчик
+        on_click=login,  # Асинхронный обработчик
         disabled=True,
         ref=btn_login
     )
@@ -248,8 +255,14 @@ async def run_server():
     init_db()
     await server.serve()
 
+async def close_api(e):
+    # Закрываем пул соединений общего клиента вместе с сессией приложения
+    await api.aclose()
+
 def main(page: ft.Page):
     apply_themes(page) # Применяем тему сразу при запуске программы
+    page.on_disconnect = close_api
+    page.on_close = close_api
     login(page)
 
 if __name__ == '__main__':
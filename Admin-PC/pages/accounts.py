@@ -1,26 +1,27 @@
+import asyncio
 import flet as ft
-import requests
+import httpx
 from plugins.card_styles import create_card
-from plugins.network import API_URL
+from plugins.api_client import api
 
 def accounts_page(page: ft.Page):
     # Загрузка данных с обработкой ошибок
-    def load_data():
-        try:
-            roles_response = requests.get(f"{API_URL}/roles")
-            users_response = requests.get(f"{API_URL}/users")
-            
-            roles = roles_response.json() if roles_response.status_code == 200 else []
-            users = users_response.json() if users_response.status_code == 200 else []
-            
-            return roles, users
-        except Exception as e:
-            print(f"Ошибка при загрузке данных: {e}")
-            return [], []
+    async def load_data():
+        # Роли и пользователи запрашиваются параллельно по общему пулу соединений
+        roles, users = await asyncio.gather(
+            api.get_json("/roles"), api.get_json("/users"), return_exceptions=True
+        )
+        for result in (roles, users):
+            if isinstance(result, Exception):
+                print(f"Ошибка при загрузке данных: {result}")
+        return (
+            [] if isinstance(roles, Exception) else roles,
+            [] if isinstance(users, Exception) else users
+        )
 
     # Обновление интерфейса
-    def update_ui():
-        roles, users = load_data()
+    async def update_ui():
+        roles, users = await load_data()
         role_cards.controls = [create_role_card(r) for r in roles]
         user_cards.controls = [create_user_card(u) for u in users]
         role_dropdown.options = [ft.dropdown.Option(r["name"]) for r in roles]
@@ -56,13 +57,13 @@ def accounts_page(page: ft.Page):
 
     # Диалог подтверждения удаления роли
     def confirm_delete_role(e, role):
-        def delete_role(_):
+        async def delete_role(_):
             try:
-                requests.delete(f"{API_URL}/roles/{role['id']}")
-                update_ui()
+                await api.delete(f"/roles/{role['id']}")
+                await update_ui()
                 dlg.open = False
                 page.update()
-            except Exception as e:
+            except httpx.HTTPError as e:
                 print(f"Ошибка при удалении роли: {e}")
 
         dlg = ft.AlertDialog(
@@ -82,13 +83,13 @@ def accounts_page(page: ft.Page):
 
     # Диалог подтверждения удаления пользователя
     def confirm_delete_user(e, user):
-        def delete_user(_):
+        async def delete_user(_):
             try:
-                requests.delete(f"{API_URL}/users/{user['id']}")
-                update_ui()
+                await api.delete(f"/users/{user['id']}")
+                await update_ui()
                 dlg.open = False
                 page.update()
-            except Exception as e:
+            except httpx.HTTPError as e:
                 print(f"Ошибка при удалении пользователя: {e}")
 
         dlg = ft.AlertDialog(
@@ -105,14 +106,14 @@ def accounts_page(page: ft.Page):
     def add_role_dialog():
         new_role = ft.TextField(label="Название роли")
 
-        def save_role(_):
+        async def save_role(_):
             if new_role.value:
                 try:
-                    requests.post(f"{API_URL}/roles", json={"name": new_role.value})
-                    update_ui()
+                    await api.post("/roles", json={"name": new_role.value})
+                    await update_ui()
                     dlg.open = False
                     page.update()
-                except Exception as e:
+                except httpx.HTTPError as e:
                     print(f"Ошибка при добавлении роли: {e}")
 
         dlg = ft.AlertDialog(
@@ -132,22 +133,23 @@ def accounts_page(page: ft.Page):
         password = ft.TextField(label="Пароль", password=True)
         full_name = ft.TextField(label="Полное имя")
         role_dropdown = ft.Dropdown(label="Роль")
+        roles = []
 
-        def load_roles():
+        async def load_roles():
             try:
-                roles = requests.get(f"{API_URL}/roles").json()
+                roles[:] = await api.get_json("/roles")
                 role_dropdown.options = [ft.dropdown.Option(r["name"]) for r in roles]
                 page.update()
-            except Exception as e:
+            except httpx.HTTPError as e:
                 print(f"Ошибка при загрузке ролей: {e}")
 
-        load_roles()
+        page.run_task(load_roles)
 
-        def save_user(_):
+        async def save_user(_):
             if all([username.value, password.value, full_name.value, role_dropdown.value]):
                 try:
-                    role_id = next(r["id"] for r in requests.get(f"{API_URL}/roles").json() 
-                                if r["name"] == role_dropdown.value)
+                    # id берем из уже загруженного для списка ответа
+                    role_id = next(r["id"] for r in roles if r["name"] == role_dropdown.value)
                     
                     user_data = {
                         "username": username.value,
@@ -156,11 +158,11 @@ def accounts_page(page: ft.Page):
                         "role_id": role_id
                     }
                     
-                    requests.post(f"{API_URL}/register", json=user_data)
-                    update_ui()
+                    await api.post("/register", json=user_data)
+                    await update_ui()
                     dlg.open = False
                     page.update()
-                except Exception as e:
+                except (httpx.HTTPError, StopIteration) as e:
                     print(f"Ошибка при добавлении пользователя: {e}")
 
         dlg = ft.AlertDialog(
@@ -186,7 +188,7 @@ def accounts_page(page: ft.Page):
 
     # Очистка страницы перед добавлением нового контента
     page.clean()
-    update_ui()
+    page.run_task(update_ui)
 
     # Добавление контента
     page.add(
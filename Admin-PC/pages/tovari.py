@@ -1,14 +1,21 @@
 import flet as ft
-import requests
+import httpx
 import os
+import asyncio
 from functools import lru_cache
 from contextlib import contextmanager
-from datetime import datetime
 from plugins.network import API_URL
+from plugins.api_client import api, error_detail
+from plugins.resource_cache import resource_cache
 
 class TovariPage:
     IMAGES_BASE_URL = f"{API_URL}/imgs"
     IMAGES_DIR = r"C:\\serverShiDari\\Imgs"
+    ITEMS_PAGE_SIZE = 40
+    # Догружаем следующую страницу, когда до конца сетки осталось меньше этого числа пикселей
+    ITEMS_SCROLL_THRESHOLD = 400
+    SEARCH_DEBOUNCE = 0.3
+    SEARCH_LIMIT = 100
     
     def __init__(self, page: ft.Page):
         self.page = page
@@ -16,6 +23,7 @@ class TovariPage:
         self.state = AppState()
         self.current_dialog = None
         self.selected_image_path = None
+        self._search_future = None
         self._init_ui()
         self._setup_file_picker()
         self._setup_directories()
@@ -29,7 +37,8 @@ class TovariPage:
                 "category_list": ft.ListView(expand=True, spacing=10, padding=10),
                 "content_view": ft.GridView(
                     expand=True, runs_count=5, max_extent=260,
-                    child_aspect_ratio=0.8, spacing=10, padding=10
+                    child_aspect_ratio=0.8, spacing=10, padding=10,
+                    on_scroll=self._handle_items_scroll, on_scroll_interval=100
                 )
             },
             1: {
@@ -37,7 +46,8 @@ class TovariPage:
                 "category_list": ft.ListView(expand=True, spacing=10, padding=10),
                 "content_view": ft.GridView(
                     expand=True, runs_count=5, max_extent=260,
-                    child_aspect_ratio=0.8, spacing=10, padding=10
+                    child_aspect_ratio=0.8, spacing=10, padding=10,
+                    on_scroll=self._handle_items_scroll, on_scroll_interval=100
                 )
             }
         }
@@ -74,11 +84,16 @@ class TovariPage:
         self.selected_tab = self.tabs.selected_index
         self.update_interface()
 
-    def _handle_delete_category(self, category):
+    async def _handle_delete_category(self, category):
         try:
-            response = requests.delete(f"{API_URL}/categories/{category['id']}")
-            response.raise_for_status()
-            self.load_categories()
+            await api.delete(f"/categories/{category['id']}")
+            await self._invalidate(
+                ("tree", category['tab']),
+                ("subcategories", category.get('parent_id')),
+                ("subcategories", category['id']),
+                ("items", category['id'])
+            )
+            await self.load_categories()
             self._show_snackbar("Категория успешно удалена")
         except Exception as e:
             self._show_snackbar(f"Ошибка при удалении: {str(e)}")
@@ -88,19 +103,18 @@ class TovariPage:
         param_field = ft.TextField(label="Параметр", value=category.get('parameter', ''))
         unit_field = ft.TextField(label="Единица измерения", value=category['unit'])
 
-        def save_changes(e):
+        async def save_changes(e):
             try:
                 update_data = {
                     "name": name_field.value,
                     "parameter": param_field.value,
                     "unit": unit_field.value
                 }
-                response = requests.put(
-                    f"{API_URL}/categories/{category['id']}",
-                    json=update_data
-                )
-                response.raise_for_status()
-                self.load_categories()
+                await api.put(f"/categories/{category['id']}", json=update_data)
+                await self._invalidate(("tree", category['tab']), ("subcategories", category.get('parent_id')))
+                # Карточки товаров держат старый словарь категории
+                self.state.item_cards = {}
+                await self.load_categories()
                 self.page.close(dlg)
                 self._show_snackbar("Изменения сохранены")
             except Exception as e:
@@ -127,26 +141,26 @@ class TovariPage:
         self.page.open(dlg)
         self.page.update()
 
-    def _handle_delete_item(self, item, category):
+    async def _handle_delete_item(self, item, category):
         try:
-            response = requests.delete(f"{API_URL}/items/{item['id']}")
-            response.raise_for_status()
+            await api.delete(f"/items/{item['id']}")
+            # Счетчики товаров в дереве тоже изменились
+            await self._invalidate(("items", category['id']), ("tree", category['tab']))
+            self.state.item_cards.pop(item['id'], None)
             
-            # Принудительно обновляем список товаров
-            self._load_category_items(category, force_refresh=True)
+            await self._load_category_items(category)
             self._show_snackbar("Товар успешно удален")
             
         except Exception as e:
             self._show_snackbar(f"Ошибка при удалении: {str(e)}")
 
-    def _handle_edit_item(self, item, category):
+    async def _handle_edit_item(self, item, category):
         self.selected_image_path = None
         self.mic_checkbox = ft.Checkbox(label="Имеется микрофон", value=item['mic'] == 1)
 
         try:
-            response = requests.get(f"{API_URL}/items/{item['id']}")
-            updated_item = response.json()
-        except Exception as e:
+            updated_item = await api.get_json(f"/items/{item['id']}")
+        except httpx.HTTPError as e:
             self._show_snackbar(f"Ошибка загрузки данных: {str(e)}")
             return
 
@@ -206,7 +220,7 @@ class TovariPage:
             ft.Row([
                 ft.ElevatedButton(
                     "Сохранить",
-                    on_click=lambda e: self._update_item(item, category)
+                    on_click=lambda e: self.page.run_task(self._update_item, item, category)
                 ),
                 ft.ElevatedButton("Отмена", on_click=self._close_dialog)
             ], alignment=ft.MainAxisAlignment.END)
@@ -226,7 +240,7 @@ class TovariPage:
         self.page.open(self.current_dialog)
         self.page.update()
 
-    def _update_item(self, item, category):
+    async def _update_item(self, item, category):
         errors = self._validate_dialog_fields()
         if errors:
             self._show_snackbar("\n".join(errors))
@@ -237,10 +251,9 @@ class TovariPage:
             with open(self.selected_image_path, "rb") as f:
                 files = {"image": (os.path.basename(self.selected_image_path), f)}
                 try:
-                    response = requests.post(f"{API_URL}/upload_image", files=files)
-                    response.raise_for_status()
+                    response = await api.post("/upload_image", files=files)
                     image_id = response.json()["image_id"]
-                except Exception as e:
+                except httpx.HTTPError as e:
                     self._show_snackbar(f"Ошибка загрузки изображения: {str(e)}")
                     return
 
@@ -256,22 +269,21 @@ class TovariPage:
         }
 
         try:
-            response = requests.put(
-                f"{API_URL}/items/{item['id']}",
-                json=item_data
-            )
-            response.raise_for_status()
-            self._load_category_items(category)
+            await api.put(f"/items/{item['id']}", json=item_data)
+            await self._invalidate(("items", category['id']))
             self._close_dialog()
             self._show_snackbar("Товар успешно обновлен!")
 
-            self._load_category_items(category, force_refresh=True)
-        except Exception as e:
+            await self._load_category_items(category)
+        except httpx.HTTPError as e:
             self._show_snackbar(f"Ошибка: {str(e)}")
 
     def update_interface(self):
         # Сбрасываем выбранную категорию при возврате
         self.state.selected_category = None  # <-- Добавлено сброс состояния
+        self.state.items_category = None
+        self.state.search_active = False
+        self._cancel_search()
         
         current_tab = self.tab_contents[self.selected_tab]
         current_tab["category_list"] = ft.ListView(expand=True, spacing=10, padding=10)
@@ -280,17 +292,14 @@ class TovariPage:
             current_tab["category_list"]
         )
         
-        if self.selected_tab in self.state.categories_by_tab:
-            del self.state.categories_by_tab[self.selected_tab]
-        
-        self.load_categories()
+        self.page.run_task(self.load_categories)
 
     def tovari_interface(self):
         self.state.selected_category = None
         self.tab1_content.content = self._create_interface_layout(
             "Поиск товаров", self.category_list_view
         )
-        self.load_categories()
+        self.page.run_task(self.load_categories)
 
     def _create_interface_layout(self, search_label, category_list):
         return ft.Container(
@@ -329,52 +338,63 @@ class TovariPage:
             expand=True
         )
         
-        original_content = current_tab["main_container"].content
-        current_tab["main_container"].content = ft.Stack(
-            controls=[
-                original_content,
-                loading_container
-            ],
-            expand=True
-        )
+        # Вложенные и параллельные загрузки делят один индикатор; снимает его последняя
+        if current_tab.get("loading_depth", 0) == 0:
+            current_tab["loading_stack"] = ft.Stack(
+                controls=[
+                    current_tab["main_container"].content,
+                    loading_container
+                ],
+                expand=True
+            )
+            current_tab["main_container"].content = current_tab["loading_stack"]
+        current_tab["loading_depth"] = current_tab.get("loading_depth", 0) + 1
         
         try:
             self.page.update()
             yield
         finally:
-            current_tab["main_container"].content = original_content
-            self.page.update()
-
-    def load_categories(self):
+            current_tab["loading_depth"] -= 1
+            if current_tab["loading_depth"] == 0:
+                loading_stack = current_tab.pop("loading_stack")
+                # Пока шла загрузка, контейнер могли заменить новым интерфейсом - его не трогаем
+                if current_tab["main_container"].content is loading_stack:
+                    current_tab["main_container"].content = loading_stack.controls[0]
+                self.page.update()
+
+    async def load_categories(self):
         with self._loading_indicator():
-            # Всегда очищаем кеш перед загрузкой
-            if self.selected_tab in self.state.categories_by_tab:
-                del self.state.categories_by_tab[self.selected_tab]
-                
-            data = self._fetch_data(
-                f"{API_URL}/categories",
-                params={
-                    "tab": self.selected_tab,
-                    "parent_id": None
-                },
-                error_message="Ошибка при загрузке категорий"
-            )
-            if data:
-                self.state.categories_by_tab[self.selected_tab] = data
-                # Принудительно обновляем все категории
-                for cat in data:
-                    cat['content_type'] = cat.get('content_type', 'default')
+            await self._load_tree(self.selected_tab)
             self._update_category_list()
             
             # Явное обновление интерфейса
             self.page.update()
 
-    def _fetch_data(self, url, params=None, error_message=""):
+    async def _load_tree(self, tab):
+        # Все дерево вкладки одним запросом - переходы по подкатегориям идут без запросов
+        data = await self._fetch_cached(
+            ("tree", tab),
+            "/categories/tree",
+            params={"tab": tab},
+            error_message="Ошибка при загрузке категорий"
+        )
+        if data is not None and data is not self.state.categories_by_tab.get(tab):
+            self.state.categories_by_tab[tab] = data
+            self.state.index_tree(data)
+        return data
+
+    async def _fetch_cached(self, key, path, params=None, error_message=""):
+        return await resource_cache.get(key, lambda: self._fetch_data(path, params, error_message))
+
+    async def _invalidate(self, *prefixes):
+        # Точечный сброс после своей записи: остальные ключи кэша остаются валидными
+        resource_cache.invalidate(*prefixes)
+        await resource_cache.adopt_revision()
+
+    async def _fetch_data(self, path, params=None, error_message="", coalesce=True):
         try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return await api.get_json(path, params=params, coalesce=coalesce)
+        except httpx.HTTPError as e:
             self._show_snackbar(f"{error_message}: {str(e)}")
             return None
 
@@ -402,7 +422,13 @@ class TovariPage:
                             controls=[
                                 ft.Text(category['name'], size=16, weight=ft.FontWeight.BOLD),
                                 ft.Text(f"Параметр: {category['parameter'] or 'Не указан'}", size=14),
-                                ft.Text(f"Ед. измерения: {category['unit']}", size=14)
+                                ft.Text(f"Ед. измерения: {category['unit']}", size=14),
+                                ft.Text(
+                                    f"Товаров: {category.get('total_item_count')}",
+                                    size=12,
+                                    color=ft.Colors.GREY,
+                                    visible=category.get('total_item_count') is not None
+                                )
                             ],
                             expand=True,
                             spacing=5
@@ -415,7 +441,7 @@ class TovariPage:
                                 ),
                                 ft.PopupMenuItem(
                                     text="Удалить", 
-                                    on_click=lambda e, cat=category: self._handle_delete_category(cat)
+                                    on_click=lambda e, cat=category: self.page.run_task(self._handle_delete_category, cat)
                                 )
                             ]
                         )
@@ -424,47 +450,118 @@ class TovariPage:
                 ),
                 padding=10,
                 margin=5,
-                on_click=lambda e: self._show_category_content(category),
+                on_click=lambda e: self.page.run_task(self._show_category_content, category),
             ),
             elevation=3,
             margin=5
         )
     
-    def _show_category_content(self, category):
+    async def _show_category_content(self, category):
         self.state.selected_category = category
+        self._cancel_search()
         current_tab = self.tab_contents[self.selected_tab]
         
         # Очищаем предыдущие данные перед загрузкой новых
         current_tab["content_view"].controls = []  # <-- Очистка товаров
         current_tab["category_list"].controls = [] # <-- Очистка подкатегорий
         
+        current_tab["browse_view"] = (
+            current_tab["category_list"] if category['content_type'] == 'categories'
+            else current_tab["content_view"]
+        )
+        current_tab["body"] = ft.Column(
+            controls=[
+                ft.Row(
+                    controls=[
+                        ft.ElevatedButton("Назад", on_click=lambda e: self.update_interface()),
+                        ft.TextField(
+                            label="Поиск",
+                            expand=True,
+                            on_change=lambda e, cat=category: self._handle_search_change(e, cat)
+                        ),
+                        self._create_content_button(category)
+                    ],
+                    alignment=ft.MainAxisAlignment.SPACE_BETWEEN
+                ),
+                current_tab["browse_view"]
+            ],
+            expand=True
+        )
         new_content = ft.Container(
             margin=20,
             padding=10,
-            content=ft.Column(
-                controls=[
-                    ft.Row(
-                        controls=[
-                            ft.ElevatedButton("Назад", on_click=lambda e: self.update_interface()),
-                            ft.TextField(label="Поиск", expand=True),
-                            self._create_content_button(category)
-                        ],
-                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN
-                    ),
-                    current_tab["category_list"] if category['content_type'] == 'categories' 
-                        else current_tab["content_view"]
-                ],
-                expand=True
-            )
+            content=current_tab["body"]
         )
         
         current_tab["main_container"].content = new_content
         self.page.update()  # <-- Принудительное обновление интерфейса
         
         if category['content_type'] in ['default', 'items']:
-            self._load_category_items(category)
+            await self._load_category_items(category)
         elif category['content_type'] == 'categories':
-            self._load_subcategories(category)
+            await self._load_subcategories(category)
+
+    def _handle_search_change(self, e, category):
+        # Новое нажатие отменяет ожидающий или выполняющийся поиск
+        self._cancel_search()
+        self._search_future = self.page.run_task(self._run_search, category, (e.control.value or "").strip())
+
+    def _cancel_search(self):
+        if self._search_future is not None and not self._search_future.done():
+            self._search_future.cancel()
+        self._search_future = None
+
+    async def _run_search(self, category, query):
+        await asyncio.sleep(self.SEARCH_DEBOUNCE)
+        if not query:
+            self._end_search()
+            return
+
+        data = await self._fetch_data(
+            "/items/search",
+            params={"query": query, "category_id": category['id'], "limit": self.SEARCH_LIMIT},
+            error_message="Ошибка поиска",
+            # Следующее нажатие отменит задачу - вместе с ней обрывается и запрос к серверу
+            coalesce=False
+        )
+        if data is None or self.state.selected_category is not category:
+            return
+        self._show_search_results(category, data)
+
+    def _show_search_results(self, category, items):
+        current_tab = self.tab_contents[self.selected_tab]
+        content_view = current_tab["content_view"]
+        if not self.state.search_active:
+            # Запоминаем обычный вид, чтобы вернуть его после очистки поиска
+            self.state.search_active = True
+            self.state.browse_controls = list(content_view.controls)
+            current_tab["body"].controls[1] = content_view
+
+        # Уже построенные карточки переиспользуются - Flet отправит только разницу
+        content_view.controls = [
+            self._get_item_card(item, self.state.tree_by_id.get(item['category_id'], category))
+            for item in items
+        ]
+        self.page.update()
+
+    def _end_search(self):
+        if not self.state.search_active:
+            return
+        current_tab = self.tab_contents[self.selected_tab]
+        current_tab["content_view"].controls = self.state.browse_controls
+        current_tab["body"].controls[1] = current_tab["browse_view"]
+        self.state.search_active = False
+        self.state.browse_controls = []
+        self.page.update()
+
+    def _get_item_card(self, item, category):
+        card = self.state.item_cards.get(item['id'])
+        # Карточку пересобираем, только если данные товара изменились
+        if card is None or card.data != item:
+            card = self._create_item_card(item, category)
+            card.data = item
+            self.state.item_cards[item['id']] = card
+        return card
 
     def _create_content_button(self, category):
         # Для всех категорий с content_type=default показываем оба варианта
@@ -497,48 +594,77 @@ class TovariPage:
         
         return ft.Container()
 
-    def _load_category_items(self, category, force_refresh=False):
-        if force_refresh:
-            # Добавляем параметр для обхода кеша
-            params = {"category_id": category['id'], "_": datetime.now().timestamp()}
-        else:
-            params = {"category_id": category['id']}
-
-        data = self._fetch_data(
-            f"{API_URL}/items",
+    async def _load_category_items(self, category):
+        current_tab = self.tab_contents[self.selected_tab]
+        self.state.items_cursor = None
+        self.state.items_category = category
+        self.state.search_active = False
+        with self._loading_indicator():
+            # Явная очистка перед загрузкой новых данных
+            current_tab["content_view"].controls = []
+            await self._load_next_items_page(category)
+            if not current_tab["content_view"].controls:
+                self._show_snackbar("В этой категории пока нет товаров")
+
+    async def _load_next_items_page(self, category):
+        # Пока идет запрос, пользователь мог открыть другую категорию или вкладку
+        cursor = self.state.items_cursor
+        tab_index = self.selected_tab
+        params = {"category_id": category['id'], "limit": self.ITEMS_PAGE_SIZE}
+        if cursor is not None:
+            params["after_id"] = cursor
+
+        data = await self._fetch_cached(
+            ("items", category['id'], cursor),
+            "/items",
             params=params,
             error_message="Ошибка при загрузке товаров"
         )
+        if (self.state.items_category is not category or self.state.items_cursor != cursor
+                or self.selected_tab != tab_index or self.state.search_active):
+            # Ответ устарел - не дописываем чужие товары в текущий список
+            return
+        if data is None:
+            self.state.items_cursor = None
+            return
+
         current_tab = self.tab_contents[self.selected_tab]
-        with self._loading_indicator():
-            # Явная очистка перед загрузкой новых данных
-            current_tab["content_view"].controls = []  # <-- Добавлено
-            self.page.update()
-            
-            data = self._fetch_data(
-                f"{API_URL}/items",
-                params={"category_id": category['id']},
-                error_message="Ошибка при загрузке товаров"
-            )
-            if data:
-                current_tab["content_view"].controls = [
-                    self._create_item_card(item, category)
-                    for item in data
-                ]
-                if not data:
-                    self._show_snackbar("В этой категории пока нет товаров")
-            else:
-                current_tab["content_view"].controls = []
+        current_tab["content_view"].controls.extend(
+            self._get_item_card(item, category) for item in data["items"]
+        )
+        self.state.items_cursor = data["next_cursor"]
 
-    def _load_subcategories(self, category):
+    async def _handle_items_scroll(self, e: ft.OnScrollEvent):
+        if self.state.items_cursor is None or self.state.items_loading or self.state.items_category is None:
+            return
+        if self.state.search_active:
+            return
+        if e.pixels < e.max_scroll_extent - self.ITEMS_SCROLL_THRESHOLD:
+            return
+
+        self.state.items_loading = True
+        try:
+            await self._load_next_items_page(self.state.items_category)
+            self.tab_contents[self.selected_tab]["content_view"].update()
+        finally:
+            self.state.items_loading = False
+
+    async def _load_subcategories(self, category):
         current_tab = self.tab_contents[self.selected_tab]
         with self._loading_indicator():
-            data = self._fetch_data(
-                f"{API_URL}/categories",
-                params={"parent_id": category['id']},
-                error_message="Ошибка при загрузке подкатегорий"
-            )
-            if data:
+            # Дерево берется из кэша; после записи или смены ревизии оно загрузится заново
+            await self._load_tree(category['tab'])
+            node = self.state.tree_by_id.get(category['id'])
+            if node is not None:
+                data = node['children']
+            else:
+                data = await self._fetch_cached(
+                    ("subcategories", category['id']),
+                    "/categories",
+                    params={"parent_id": category['id']},
+                    error_message="Ошибка при загрузке подкатегорий"
+                )
+            if data is not None:
                 current_tab["category_list"].controls = [
                     self._create_category_card(subcat) for subcat in data
                 ]
@@ -547,7 +673,8 @@ class TovariPage:
 
     @lru_cache(maxsize=32)
     def _get_image_url(self, image_id):
-        return f"{self.IMAGES_BASE_URL}/{image_id}" if image_id else f"{self.IMAGES_BASE_URL}/default"
+        # Для сетки хватает уменьшенной копии 120x100
+        return f"{self.IMAGES_BASE_URL}/{image_id}?size=thumb" if image_id else f"{self.IMAGES_BASE_URL}/default"
 
     def _create_item_card(self, item, category):
         image_with_icon = ft.Container(
@@ -651,11 +778,11 @@ class TovariPage:
                                         items=[
                                             ft.PopupMenuItem(
                                                 text="Изменить",
-                                                on_click=lambda e, it=item: self._handle_edit_item(it, category)
+                                                on_click=lambda e, it=item: self.page.run_task(self._handle_edit_item, it, category)
                                             ),
                                             ft.PopupMenuItem(
                                                 text="Удалить",
-                                                on_click=lambda e, it=item: self._handle_delete_item(it, category)
+                                                on_click=lambda e, it=item: self.page.run_task(self._handle_delete_item, it, category)
                                             )
                                         ]
                                     )
@@ -698,15 +825,13 @@ class TovariPage:
                         [
                             ft.ElevatedButton(
                                 "Создать",
-                                on_click=lambda e: [
-                                    self._create_subcategory(
-                                        parent_category,
-                                        name_field.value,
-                                        param_field.value,
-                                        unit_field.value
-                                    ),
-                                    close_dlg(e)
-                                ]
+                                on_click=lambda e: self.page.run_task(
+                                    self._create_subcategory,
+                                    parent_category,
+                                    name_field.value,
+                                    param_field.value,
+                                    unit_field.value
+                                )
                             ),
                             ft.ElevatedButton("Отмена", on_click=close_dlg)
                         ],
@@ -719,7 +844,7 @@ class TovariPage:
         self.page.open(dlg)
         self.page.update()
 
-    def _create_subcategory(self, parent_category, name, param, unit):
+    async def _create_subcategory(self, parent_category, name, param, unit):
         try:
             if not name.strip():
                 raise ValueError("Название подкатегории обязательно")
@@ -727,8 +852,8 @@ class TovariPage:
                 raise ValueError("Единица измерения обязательна")
 
             # Создаем подкатегорию и проверяем ответ
-            response = requests.post(
-                f"{API_URL}/categories",
+            await api.post(
+                "/categories",
                 json={
                     "name": name,
                     "parameter": param,
@@ -738,23 +863,21 @@ class TovariPage:
                     "content_type": "default"
                 }
             )
-            response.raise_for_status()  # Важно: проверяем статус ответа
 
             # Обновляем тип контента родителя при необходимости
             if parent_category['content_type'] == 'default':
-                update_response = requests.put(
-                    f"{API_URL}/categories/{parent_category['id']}",
+                await api.put(
+                    f"/categories/{parent_category['id']}",
                     json={"content_type": "categories"}
                 )
-                update_response.raise_for_status()
                 parent_category['content_type'] = 'categories'
 
-            self._load_subcategories(parent_category)
+            await self._invalidate(("tree", parent_category['tab']), ("subcategories", parent_category['id']))
+            await self._load_subcategories(parent_category)
             self._show_snackbar("Подкатегория успешно создана!")
 
-        except requests.exceptions.HTTPError as err:
-            error_msg = err.response.json().get("detail", err.response.text)
-            self._show_snackbar(f"Ошибка сервера: {error_msg}")
+        except httpx.HTTPStatusError as err:
+            self._show_snackbar(f"Ошибка сервера: {error_detail(err)}")
         except Exception as err:
             self._show_snackbar(str(err))
         finally:
@@ -782,14 +905,12 @@ class TovariPage:
                         [
                             ft.ElevatedButton(
                                 "Создать",
-                                on_click=lambda e: [
-                                    self._create_category(
-                                        name_field.value,
-                                        param_field.value,
-                                        unit_field.value
-                                    ),
-                                    self.page.close(dlg)
-                                ]
+                                on_click=lambda e: self.page.run_task(
+                                    self._create_category,
+                                    name_field.value,
+                                    param_field.value,
+                                    unit_field.value
+                                )
                             ),
                             ft.ElevatedButton("Отмена", on_click=close_dlg)
                         ],
@@ -825,7 +946,7 @@ class TovariPage:
             title="Добавить товар",
             category=category,
             fields=fields,
-            on_confirm=lambda e: self._create_item(category)
+            on_confirm=lambda e: self.page.run_task(self._create_item, category)
         )
 
     def _handle_image_picked(self, e: ft.FilePickerResultEvent):
@@ -839,7 +960,7 @@ class TovariPage:
                         control.update()  # Принудительное обновление элемента
                         break
 
-    def _create_item(self, category):
+    async def _create_item(self, category):
         errors = self._validate_dialog_fields()
         if errors:
             self._show_snackbar("\n".join(errors))
@@ -850,10 +971,9 @@ class TovariPage:
             with open(self.selected_image_path, "rb") as f:
                 files = {"image": (os.path.basename(self.selected_image_path), f)}
                 try:
-                    response = requests.post(f"{API_URL}/upload_image", files=files)
-                    response.raise_for_status()
+                    response = await api.post("/upload_image", files=files)
                     image_id = response.json()["image_id"]
-                except Exception as e:
+                except httpx.HTTPError as e:
                     self._show_snackbar(f"Ошибка загрузки изображения: {str(e)}")
                     return
 
@@ -870,21 +990,19 @@ class TovariPage:
 
 
         try:
-            response = requests.post(f"{API_URL}/items", json=item_data)
-            if response.ok:
-                if category['content_type'] == 'default':
-                    # Обновляем контент тип на 'items'
-                    requests.put(
-                        f"{API_URL}/categories/{category['id']}",
-                        json={"content_type": "items"}
-                    )
-                    category['content_type'] = 'items'
-                self._load_category_items(category)
-                self._show_snackbar("Товар успешно создан!")
-            else:
-                self._show_snackbar(f"Ошибка: {response.text}")
-        except Exception as e:
-            self._show_snackbar(f"Ошибка: {str(e)}")
+            await api.post("/items", json=item_data)
+            if category['content_type'] == 'default':
+                # Обновляем контент тип на 'items'
+                await api.put(
+                    f"/categories/{category['id']}",
+                    json={"content_type": "items"}
+                )
+                category['content_type'] = 'items'
+            await self._invalidate(("items", category['id']), ("tree", category['tab']))
+            await self._load_category_items(category)
+            self._show_snackbar("Товар успешно создан!")
+        except httpx.HTTPError as e:
+            self._show_snackbar(f"Ошибка: {error_detail(e)}")
         finally:
             self._close_dialog()
 
@@ -942,15 +1060,15 @@ class TovariPage:
         self.page.open(self.current_dialog)
         self.page.update()
 
-    def _create_category(self, name, param, unit):
+    async def _create_category(self, name, param, unit):
         try:
             if not name.strip():
                 raise ValueError("Название категории обязательно")
             if not unit.strip():
                 raise ValueError("Единица измерения обязательна")
 
-            response = requests.post(
-                f"{API_URL}/categories",
+            await api.post(
+                "/categories",
                 json={
                     "name": name,
                     "parameter": param,
@@ -959,11 +1077,9 @@ class TovariPage:
                     "content_type": "default"
                 }
             )
-            response.raise_for_status()
 
-            # Принудительное обновление данных
-            self.state.categories_by_tab.pop(self.selected_tab, None)
-            self.load_categories()
+            await self._invalidate(("tree", self.selected_tab))
+            await self.load_categories()
             
             # Явное обновление всех элементов интерфейса
             current_tab = self.tab_contents[self.selected_tab]
@@ -976,8 +1092,8 @@ class TovariPage:
 
             self._show_snackbar("Категория успешно создана!")
             
-        except requests.exceptions.HTTPError as err:
-            self._show_snackbar(f"Ошибка сервера: {err.response.text}")
+        except httpx.HTTPStatusError as err:
+            self._show_snackbar(f"Ошибка сервера: {error_detail(err)}")
         except Exception as err:
             self._show_snackbar(str(err))
         finally:
@@ -1008,7 +1124,24 @@ class TovariPage:
 class AppState:
     def __init__(self):
         self.categories_by_tab = {}
+        self.tree_by_id = {}
         self.selected_category = None
+        # Состояние постраничной загрузки товаров
+        self.items_category = None
+        self.items_cursor = None
+        self.items_loading = False
+        # Карточки товаров по id и состояние поиска
+        self.item_cards = {}
+        self.search_active = False
+        self.browse_controls = []
+
+    def index_tree(self, roots):
+        # Индекс узлов дерева по id для переходов без повторных запросов
+        stack = list(roots)
+        while stack:
+            node = stack.pop()
+            self.tree_by_id[node['id']] = node
+            stack.extend(node.get('children', []))
 
 def tovari_page(e: ft.ControlEvent):
     page = e.page
@@ -0,0 +1,132 @@
+import asyncio
+import httpx
+from plugins.network import API_URL
+
+REQUEST_TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30)
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.3  # секунды, удваивается с каждой попыткой
+# Повторять можно только запросы, которые не создают новых записей
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+RETRY_STATUSES = {502, 503, 504}
+
+
+class ApiClient:
+    """Общий асинхронный клиент API: один пул keep-alive соединений на все страницы.
+
+    Ответы с кодом ошибки поднимают httpx.HTTPStatusError, сетевые ошибки - httpx.TransportError.
+    304 Not Modified возвращается как есть: это ответ на условный запрос, а не ошибка.
+    """
+
+    def __init__(self, base_url=API_URL):
+        self.base_url = base_url
+        self._client = None
+        self._loop = None
+        self.headers = {}
+        # Выполняющиеся GET-запросы: ключ -> задача, которую делят все ожидающие
+        self._inflight = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Клиент привязан к циклу событий, в котором создан
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._close_stale_client()
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url, headers=self.headers, timeout=REQUEST_TIMEOUT, limits=POOL_LIMITS
+            )
+            self._loop = loop
+            self._inflight = {}
+        return self._client
+
+    def _close_stale_client(self):
+        # Старый клиент можно закрыть только в его цикле; если цикл уже остановлен, сокеты закроет сборщик мусора
+        if self._client is not None and self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop)
+        self._client = None
+        self._loop = None
+
+    async def aclose(self):
+        """Закрывает пул соединений; следующий запрос создаст новый клиент"""
+        client, self._client, self._loop = self._client, None, None
+        self._inflight = {}
+        if client is not None:
+            await client.aclose()
+
+    def set_token(self, token):
+        """Токен сессии из /login: сервер проверяет его без bcrypt"""
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        else:
+            self.headers.pop("Authorization", None)
+        if self._client is not None:
+            self._client.headers = self.headers
+
+    async def request(self, method, path, **kwargs) -> httpx.Response:
+        client = self._get_client()
+        retries = MAX_RETRIES if method in IDEMPOTENT_METHODS and "files" not in kwargs else 0
+
+        for attempt in range(retries + 1):
+            try:
+                response = await client.request(method, path, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    if response.status_code != 304:
+                        response.raise_for_status()
+                    return response
+            except httpx.TransportError:
+                if attempt == retries:
+                    raise
+            await asyncio.sleep(BACKOFF_BASE * 2 ** attempt)
+
+    async def get(self, path, params=None) -> httpx.Response:
+        return await self.request("GET", path, params=params)
+
+    async def post(self, path, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path, **kwargs) -> httpx.Response:
+        return await self.request("PUT", path, **kwargs)
+
+    async def delete(self, path) -> httpx.Response:
+        return await self.request("DELETE", path)
+
+    async def get_json(self, path, params=None, coalesce=True):
+        """GET с объединением: одинаковые одновременные запросы получают один ответ.
+
+        coalesce=False - отдельный запрос без shield: отмена задачи обрывает и сам HTTP-запрос
+        (поиск при наборе, где устаревший ответ не нужен никому).
+        """
+        if not coalesce:
+            return await self._fetch_json(path, params)
+        self._get_client()
+        key = (path, tuple(sorted((params or {}).items())))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_json(path, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_inflight(key, done))
+        # shield: отмена одного ожидающего (например, устаревшего поиска) не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    async def _fetch_json(self, path, params):
+        response = await self.get(path, params=params)
+        return response.json()
+
+    def _finish_inflight(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Ошибку уже получили ожидающие; если их не осталось, не пишем "exception was never retrieved"
+            task.exception()
+
+
+def error_detail(error: Exception) -> str:
+    """Текст ошибки для пользователя: detail из ответа сервера или описание сетевой ошибки"""
+    if isinstance(error, httpx.HTTPStatusError):
+        try:
+            return str(error.response.json().get("detail", error.response.text))
+        except ValueError:
+            return error.response.text
+    return str(error)
+
+
+api = ApiClient()
@@ -0,0 +1,78 @@
+import time
+import httpx
+from plugins.api_client import api
+
+CACHE_TTL = 300  # секунды жизни записи, даже если ревизия не менялась
+# /db_hash проверяется не чаще этого интервала - переходы между экранами идут без запросов
+REVISION_CHECK_INTERVAL = 10
+
+
+class ResourceCache:
+    """Кэш ответов API по ключам-кортежам, например ("items", category_id, cursor).
+
+    Запись живет CACHE_TTL секунд. Если ревизия БД на сервере (/db_hash) изменилась -
+    данные поменял кто-то другой, и кэш сбрасывается целиком. Свои изменения
+    страницы сбрасывают точечно через invalidate и затем принимают новую ревизию.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, check_interval=REVISION_CHECK_INTERVAL):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._entries = {}  # ключ -> (значение, время сохранения)
+        self.revision = None
+        self._checked_at = 0.0
+
+    async def _fetch_revision(self):
+        headers = {"If-None-Match": f'"{self.revision}"'} if self.revision is not None else None
+        response = await api.request("GET", "/db_hash", headers=headers)
+        self._checked_at = time.monotonic()
+        if response.status_code == 304:
+            return self.revision
+        return response.json()
+
+    async def validate(self):
+        """Сбрасывает кэш, если ревизия на сервере ушла вперед"""
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        try:
+            revision = await self._fetch_revision()
+        except httpx.HTTPError:
+            # Сервер недоступен - живем на TTL, проверим в следующий раз
+            return
+        if revision != self.revision:
+            self._entries.clear()
+            self.revision = revision
+
+    async def adopt_revision(self):
+        """Принимает ревизию после собственной записи, не трогая остальные ключи.
+
+        Чужие изменения, попавшие между записью и этим запросом, доживут максимум до TTL.
+        """
+        try:
+            self.revision = await self._fetch_revision()
+        except httpx.HTTPError:
+            self._checked_at = 0.0
+
+    async def get(self, key, fetch):
+        """Значение из кэша или результат fetch(); None не кэшируется"""
+        await self.validate()
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+
+        value = await fetch()
+        if value is not None:
+            self._entries[key] = (value, time.monotonic())
+        return value
+
+    def invalidate(self, *prefixes):
+        """Удаляет ключи, начинающиеся с любого из префиксов: ("items", 5) удалит все страницы категории 5"""
+        for key in list(self._entries):
+            if any(key[:len(prefix)] == prefix for prefix in prefixes):
+                del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+
+resource_cache = ResourceCache()
@@ -1,5 +1,6 @@
 import flet as ft
-import requests
+import httpx
+from plugins.api_client import api, error_detail
 
 
 class RightClickHandler:
@@ -19,7 +20,7 @@ class RightClickHandler:
             title=ft.Text(f"Удалить {obj_type}?"),
             content=ft.Text(f"Вы уверены, что хотите удалить {obj['name']}?"),
             actions=[
-                ft.TextButton("Да", on_click=lambda e: self.delete(obj, obj_type, on_delete_success, confirm_dialog)),
+                ft.TextButton("Да", on_click=lambda e: self.page.run_task(self.delete, obj, obj_type, on_delete_success, confirm_dialog)),
                 ft.TextButton("Нет", on_click=lambda e: self.close_dialog(confirm_dialog)),
             ],
             actions_alignment=ft.MainAxisAlignment.END,
@@ -70,19 +71,18 @@ class RightClickHandler:
         dialog.open = True
         self.page.update()
 
-    def delete(self, obj, obj_type, on_delete_success, dialog):
+    async def delete(self, obj, obj_type, on_delete_success, dialog):
         endpoint = self.plural_mapping.get(obj_type, f"{obj_type}s")
-        url = f"http://localhost:8000/{endpoint}/{obj['id']}"
 
         try:
-            response = requests.delete(url)
-            if response.status_code == 200:
-                self.page.snack_bar = ft.SnackBar(ft.Text(f"{obj_type.capitalize()} успешно удален!"))
-                on_delete_success()
-            else:
-                self.page.snack_bar = ft.SnackBar(ft.Text(f"Ошибка: {response.text}"))
+            await api.delete(f"/{endpoint}/{obj['id']}")
+            self.page.snack_bar = ft.SnackBar(ft.Text(f"{obj_type.capitalize()} успешно удален!"))
+            on_delete_success()
             self.page.snack_bar.open = True
-        except Exception as ex:
+        except httpx.HTTPStatusError as ex:
+            self.page.snack_bar = ft.SnackBar(ft.Text(f"Ошибка: {error_detail(ex)}"))
+            self.page.snack_bar.open = True
+        except httpx.HTTPError as ex:
             self.page.snack_bar = ft.SnackBar(ft.Text(f"Ошибка подключения: {ex}"))
             self.page.snack_bar.open = True
 
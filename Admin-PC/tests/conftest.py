@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+
+# Сервер пишет в SERVER_DIR при импорте - тестам нужна своя временная папка
+os.environ.setdefault("SHIDARI_SERVER_DIR", tempfile.mkdtemp(prefix="shidari-tests-"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import server  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+# Снимки БД собираются в фоне и тестам не нужны
+server.SNAPSHOT_DELAY = 3600
+
+
+@pytest.fixture
+def client():
+    """Клиент API на пустой базе: файл БД и кэши сервера сбрасываются перед каждым тестом"""
+    server.engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        path = server.DEFAULT_DB_PATH + suffix
+        if os.path.exists(path):
+            os.remove(path)
+    for name in os.listdir(server.SNAPSHOTS_DIR):
+        # Ревизии в каждом тесте начинаются заново - снимки прошлых тестов совпали бы по имени
+        os.remove(os.path.join(server.SNAPSHOTS_DIR, name))
+    server._cached_revision["value"] = None
+    server._role_names.clear()
+    server._sessions.clear()
+    server.init_db()
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def count_queries():
+    """Контекстный менеджер, собирающий SQL-запросы, выполненные через engine"""
+    @contextmanager
+    def counting():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(server.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(server.engine, "before_cursor_execute", before_cursor_execute)
+
+    return counting
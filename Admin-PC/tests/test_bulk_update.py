@@ -0,0 +1,86 @@
+import pytest
+
+
+@pytest.fixture
+def item(client):
+    category = client.post("/categories", json={"name": "root", "unit": "шт", "tab": 0}).json()
+    response = client.post("/items", json={
+        "name": "item", "category_id": category["id"], "parameter_value": "",
+        "unit": "шт", "cost_price": 100, "selling_price": 150, "mic": 0
+    })
+    response.raise_for_status()
+    return response.json()
+
+
+@pytest.mark.parametrize("field", ["name", "unit", "cost_price", "selling_price"])
+def test_patch_rejects_null(client, item, field):
+    response = client.post("/items/bulk_update", json={"patches": [{"id": item["id"], field: None}]})
+
+    assert response.status_code == 422
+    assert client.get(f"/items/{item['id']}").json()[field] == item[field]
+
+
+def test_patch_updates_given_fields(client, item):
+    response = client.post("/items/bulk_update", json={"patches": [{"id": item["id"], "selling_price": 200}]})
+
+    assert response.status_code == 200
+    assert client.get(f"/items/{item['id']}").json()["selling_price"] == 200
+
+
+def test_patch_rejects_duplicate_ids(client, item):
+    response = client.post("/items/bulk_update", json={"patches": [
+        {"id": item["id"], "selling_price": 200}, {"id": item["id"], "selling_price": 300}
+    ]})
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["ids"] == [item["id"]]
+    assert client.get(f"/items/{item['id']}").json()["selling_price"] == 150
+
+
+@pytest.fixture
+def catalog(client, item):
+    other_category = client.post("/categories", json={"name": "other", "unit": "шт", "tab": 0}).json()
+    other = client.post("/items", json={**{key: item[key] for key in (
+        "name", "parameter_value", "unit", "cost_price", "selling_price", "mic"
+    )}, "category_id": other_category["id"]}).json()
+    return item, other
+
+
+def prices(client, items):
+    return [client.get(f"/items/{item['id']}").json()["selling_price"] for item in items]
+
+
+@pytest.mark.parametrize("rule", [
+    {"percent": 10},
+    {"percent": 10, "category_id": 1, "all": True},
+    {"percent": 10, "ids": [1], "all": True},
+])
+def test_rule_requires_exactly_one_scope(client, catalog, rule):
+    response = client.post("/items/bulk_update", json={"rule": rule})
+
+    assert response.status_code == 400
+    assert prices(client, catalog) == [150, 150]
+
+
+def test_rule_scopes(client, catalog):
+    item, other = catalog
+
+    client.post("/items/bulk_update", json={"rule": {"category_id": item["category_id"], "amount": 10}}).raise_for_status()
+    assert prices(client, catalog) == [160, 150]
+
+    client.post("/items/bulk_update", json={"rule": {"ids": [other["id"]], "amount": 20}}).raise_for_status()
+    assert prices(client, catalog) == [160, 170]
+
+    response = client.post("/items/bulk_update", json={"rule": {"all": True, "percent": 50, "round_to": 10}})
+    assert response.json()["updated"] == 2
+    assert prices(client, catalog) == [240, 260]
+
+
+def test_rule_with_unknown_ids_changes_nothing(client, catalog):
+    item, _ = catalog
+
+    response = client.post("/items/bulk_update", json={"rule": {"ids": [item["id"], 999], "amount": 10}})
+
+    assert response.status_code == 404
+    assert response.json()["detail"]["ids"] == [999]
+    assert prices(client, catalog) == [150, 150]
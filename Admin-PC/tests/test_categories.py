@@ -0,0 +1,62 @@
+def create_category(client, name, tab, parent_id=None):
+    response = client.post("/categories", json={"name": name, "unit": "шт", "tab": tab, "parent_id": parent_id})
+    response.raise_for_status()
+    return response.json()
+
+
+def test_pages_follow_display_order(client):
+    root = create_category(client, "root", 0)
+    for number, (group, position) in enumerate([("b", 1), (None, None), ("a", 2), ("a", 1), (None, 3), ("a", 1)]):
+        client.post("/categories", json={
+            "name": f"child {number}", "unit": "шт", "tab": 0, "parent_id": root["id"],
+            "group": group, "position": position
+        }).raise_for_status()
+    full = [row["id"] for row in client.get("/categories", params={"parent_id": root["id"]}).json()]
+
+    paged, cursor = [], None
+    while True:
+        params = {"parent_id": root["id"], "limit": 2}
+        if cursor is not None:
+            params["after_id"] = cursor
+        page = client.get("/categories", params=params).json()
+        paged.extend(row["id"] for row in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert paged == full
+    assert len(full) == 6
+
+
+def test_move_to_another_tab_moves_subtree(client):
+    source = create_category(client, "source", 0)
+    target = create_category(client, "target", 1)
+    moved = create_category(client, "moved", 0, source["id"])
+    nested = create_category(client, "nested", 0, moved["id"])
+
+    response = client.put(f"/categories/{moved['id']}", json={"parent_id": target["id"]})
+
+    assert response.status_code == 200
+    assert response.json()["tab"] == 1
+    children = client.get("/categories", params={"parent_id": moved["id"]}).json()
+    assert [(child["id"], child["tab"]) for child in children] == [(nested["id"], 1)]
+
+
+def test_subcategory_tab_must_match_parent(client):
+    root = create_category(client, "root", 0)
+    child = create_category(client, "child", 0, root["id"])
+
+    response = client.put(f"/categories/{child['id']}", json={"tab": 1})
+
+    assert response.status_code == 400
+
+
+def test_name_checked_against_new_parent(client):
+    first = create_category(client, "first", 0)
+    second = create_category(client, "second", 0)
+    create_category(client, "same", 0, second["id"])
+    moved = create_category(client, "same", 0, first["id"])
+
+    response = client.put(f"/categories/{moved['id']}", json={"parent_id": second["id"]})
+
+    assert response.status_code == 400
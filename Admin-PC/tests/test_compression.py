@@ -0,0 +1,50 @@
+import gzip
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def catalog(client):
+    for number in range(50):
+        client.post("/categories", json={"name": f"category {number}", "unit": "шт", "tab": 0}).raise_for_status()
+
+
+def test_snapshot_served_precompressed_when_accepted(client, catalog):
+    plain = client.get("/download_db", headers={"Accept-Encoding": "identity"})
+    # Сырые байты ответа, без автоматической распаковки httpx
+    with client.stream("GET", "/download_db", headers={"Accept-Encoding": "gzip"}) as compressed:
+        body = b"".join(compressed.iter_raw())
+        headers = compressed.headers
+
+    assert headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in headers["Vary"]
+    # У сжатого варианта свой ETag, чтобы кэши не перепутали представления
+    assert headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+    assert len(body) < len(plain.content)
+    assert gzip.decompress(body) == plain.content
+
+
+@pytest.mark.skipif(server.zstandard is None, reason="zstandard is not installed")
+def test_snapshot_prefers_zstd(client, catalog):
+    response = client.get("/download_db", headers={"Accept-Encoding": "gzip, zstd"})
+    assert response.headers["Content-Encoding"] == "zstd"
+
+
+def test_json_responses_gzipped_above_minimum_size(client, catalog):
+    large = client.get("/categories", headers={"Accept-Encoding": "gzip"})
+    small = client.get("/db_hash", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/categories", headers={"Accept-Encoding": "identity"})
+
+    assert large.headers["Content-Encoding"] == "gzip"
+    assert large.json() == plain.json()
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in plain.headers
+
+
+def test_images_not_recompressed(client):
+    response = client.get("/download_img/missing.jpg", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
@@ -0,0 +1,28 @@
+import sqlite3
+
+import server
+
+
+def test_db_hash_answers_not_modified_for_current_revision(client):
+    client.post("/categories", json={"name": "root", "unit": "шт", "tab": 0}).raise_for_status()
+    response = client.get("/db_hash")
+    etag = response.headers["ETag"]
+
+    assert response.json() == etag.strip('"')
+    assert client.get("/db_hash", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/categories", json={"name": "other", "unit": "шт", "tab": 0}).raise_for_status()
+    assert client.get("/db_hash", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_db_hash_sees_writes_from_another_process(client, monkeypatch):
+    etag = client.get("/db_hash").headers["ETag"]
+
+    # Запись мимо этого процесса - как второй воркер или миграция
+    with sqlite3.connect(server.DEFAULT_DB_PATH) as connection:
+        connection.execute("INSERT INTO change_log (table_name, row_id, operation) VALUES ('items', 1, 'upsert')")
+    monkeypatch.setattr(server, "REVISION_CACHE_TTL", 0)
+
+    response = client.get("/db_hash", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
@@ -0,0 +1,55 @@
+import sqlite3
+
+import pytest
+
+IDENTITY = {"Accept-Encoding": "identity"}
+
+
+@pytest.fixture
+def catalog(client):
+    for number in range(50):
+        client.post("/categories", json={"name": f"category {number}", "unit": "шт", "tab": 0}).raise_for_status()
+
+
+def test_snapshot_is_consistent_copy_of_current_revision(client, catalog, tmp_path):
+    response = client.get("/download_db", headers=IDENTITY)
+    path = tmp_path / "back.db"
+    path.write_bytes(response.content)
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    with sqlite3.connect(path) as connection:
+        revision = connection.execute("SELECT MAX(id) FROM change_log").fetchone()[0]
+        categories = connection.execute("SELECT COUNT(*) FROM categories").fetchone()[0]
+        journal_mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+    assert response.headers["ETag"] == f'"{revision}"'
+    assert revision == int(client.get("/db_hash").json())
+    assert categories == 50
+    # Снимок - самостоятельный файл, без -wal
+    assert journal_mode == "delete"
+
+
+def test_snapshot_etag_changes_only_with_revision(client, catalog):
+    etag = client.get("/download_db", headers=IDENTITY).headers["ETag"]
+
+    cached = client.get("/download_db", headers={**IDENTITY, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    client.post("/categories", json={"name": "new", "unit": "шт", "tab": 0}).raise_for_status()
+    fresh = client.get("/download_db", headers={**IDENTITY, "If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] != etag
+
+
+def test_snapshot_supports_range_resume(client, catalog):
+    full = client.get("/download_db", headers=IDENTITY)
+    etag = full.headers["ETag"]
+
+    head = client.get("/download_db", headers={**IDENTITY, "Range": "bytes=0-1023"})
+    tail = client.get("/download_db", headers={**IDENTITY, "Range": "bytes=1024-", "If-Range": etag})
+
+    assert head.status_code == 206
+    assert head.headers["Content-Range"] == f"bytes 0-1023/{len(full.content)}"
+    assert tail.status_code == 206
+    assert head.content + tail.content == full.content
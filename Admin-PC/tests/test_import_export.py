@@ -0,0 +1,98 @@
+import csv
+import io
+
+import pytest
+
+import server
+
+HEADER = "name,parameter_value,unit,cost_price,selling_price,mic\n"
+
+
+@pytest.fixture
+def category(client):
+    response = client.post("/categories", json={"name": "root", "unit": "шт", "tab": 0})
+    response.raise_for_status()
+    return response.json()
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    # Несколько пачек на маленьком файле: первая успевает вставиться до ошибки в следующей
+    monkeypatch.setattr(server, "IMPORT_BATCH_SIZE", 2)
+
+
+def upload(client, content, filename="items.csv", **params):
+    return client.post("/items/import", params=params, files={"file": (filename, content)})
+
+
+def category_items(client, category):
+    return client.get("/items", params={"category_id": category["id"]}).json()
+
+
+def csv_rows(count, start=0):
+    return "".join(f"item {number},p{number},шт,{100 + number},{150 + number},0\n" for number in range(start, start + count))
+
+
+def test_import_logs_inserted_ids(client, category, small_batches):
+    since = client.get("/sync").json()["revision"]
+
+    response = upload(client, (HEADER + csv_rows(5)).encode(), category_id=category["id"])
+
+    assert response.status_code == 200
+    assert response.json()["imported"] == 5
+    items = category_items(client, category)
+    payload = client.get("/sync", params={"since": since}).json()
+    assert sorted(row["id"] for row in payload["changed"]["items"]) == sorted(item["id"] for item in items)
+    # Категория DEFAULT с товарами стала ITEMS, как при POST /items (в БД лежит имя значения Enum)
+    assert [row["content_type"] for row in payload["changed"]["categories"]] == ["ITEMS"]
+
+
+def test_import_is_all_or_nothing(client, category, small_batches):
+    revision = client.get("/db_hash").json()
+    content = HEADER + csv_rows(4) + "broken,,шт,дорого,150,0\n" + csv_rows(1, start=4)
+
+    response = upload(client, content.encode(), category_id=category["id"])
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["errors"] == [{"row": 6, "detail": "cost_price must be an integer"}]
+    assert category_items(client, category) == []
+    assert client.get("/db_hash").json() == revision
+
+
+def test_import_row_limit(client, category, small_batches, monkeypatch):
+    monkeypatch.setattr(server, "MAX_IMPORT_ROWS", 3)
+
+    response = upload(client, (HEADER + csv_rows(4)).encode(), category_id=category["id"])
+
+    assert response.status_code == 413
+    assert category_items(client, category) == []
+
+
+def test_csv_export_round_trip(client, category):
+    upload(client, (HEADER + csv_rows(3)).encode(), category_id=category["id"]).raise_for_status()
+
+    exported = client.get("/items/export", params={"format": "csv", "category_id": category["id"]})
+    rows = list(csv.DictReader(io.StringIO(exported.content.decode("utf-8-sig"))))
+    assert [(row["name"], int(row["selling_price"]), row["category"]) for row in rows] == [
+        ("item 0", 150, "root"), ("item 1", 151, "root"), ("item 2", 152, "root")
+    ]
+
+    # Выгрузку можно загрузить обратно без правок: id и category при импорте не читаются
+    assert upload(client, exported.content).json()["imported"] == 3
+    fields = ("name", "parameter_value", "unit", "cost_price", "selling_price", "mic")
+    items = [tuple(item[field] for field in fields) for item in category_items(client, category)]
+    assert items[3:] == items[:3]
+
+
+def test_xlsx_export_round_trip(client, category):
+    openpyxl = pytest.importorskip("openpyxl")
+    upload(client, (HEADER + csv_rows(3)).encode(), category_id=category["id"]).raise_for_status()
+
+    exported = client.get("/items/export", params={"format": "xlsx", "category_id": category["id"]})
+    sheet = openpyxl.load_workbook(io.BytesIO(exported.content), read_only=True).active
+    header, *rows = sheet.iter_rows(values_only=True)
+    assert header == server.ITEM_EXPORT_COLUMNS
+    assert [(row[1], row[7]) for row in rows] == [("item 0", 150), ("item 1", 151), ("item 2", 152)]
+
+    assert upload(client, exported.content, filename="items.xlsx").json()["imported"] == 3
+    assert len(category_items(client, category)) == 6
@@ -0,0 +1,51 @@
+"""Списки не должны делать запрос на каждую строку: число запросов не зависит от числа строк"""
+
+LIST_ENDPOINTS = (
+    "/users",
+    "/roles",
+    "/categories",
+    "/categories?limit=50",
+    "/categories/tree",
+    "/items",
+    "/items?limit=50",
+    "/items?category_id={root_id}&subtree=true&limit=50",
+)
+
+
+def add_rows(client, root_id, start, count):
+    # Каждая итерация добавляет роль, пользователя, подкатегорию и товар в ней
+    for number in range(start, start + count):
+        role = client.post("/roles", json={"name": f"role {number}"}).json()
+        client.post("/register", json={
+            "username": f"user{number}", "full_name": f"User {number}",
+            "password": "secret", "role_id": role["id"]
+        }).raise_for_status()
+        category = client.post("/categories", json={
+            "name": f"sub {number}", "unit": "шт", "tab": 0, "parent_id": root_id
+        }).json()
+        client.post("/items", json={
+            "name": f"item {number}", "category_id": category["id"], "parameter_value": "",
+            "unit": "шт", "cost_price": 100, "selling_price": 150, "mic": 0
+        }).raise_for_status()
+
+
+def measure(client, count_queries, root_id):
+    counts = {}
+    for endpoint in LIST_ENDPOINTS:
+        url = endpoint.format(root_id=root_id)
+        client.get(url).raise_for_status()  # прогрев кэшей ролей и ревизии
+        with count_queries() as statements:
+            client.get(url).raise_for_status()
+        counts[url] = len(statements)
+    return counts
+
+
+def test_list_endpoints_run_constant_queries(client, count_queries):
+    root_id = client.post("/categories", json={"name": "root", "unit": "шт", "tab": 0}).json()["id"]
+
+    add_rows(client, root_id, 0, 1)
+    single = measure(client, count_queries, root_id)
+    add_rows(client, root_id, 1, 6)
+    many = measure(client, count_queries, root_id)
+
+    assert many == single
@@ -0,0 +1,51 @@
+"""Горячие запросы каталога должны идти по индексам, а не полным проходом по таблицам"""
+import re
+
+import server
+
+# SQLAlchemy называет присоединенные таблицы categories_1, items_1
+FULL_SCAN = re.compile(r"\bSCAN (categories|items)(_\d+)?\b")
+
+
+def create_category(client, name, parent_id=None):
+    response = client.post("/categories", json={"name": name, "unit": "шт", "tab": 0, "parent_id": parent_id})
+    response.raise_for_status()
+    return response.json()
+
+
+def capture_selects(client, count_queries, url):
+    with count_queries() as statements:
+        client.get(url).raise_for_status()
+    return [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+
+
+def query_plan(statement):
+    # Параметры не влияют на выбор индекса, подставляем NULL вместо каждого "?"
+    with server.engine.connect() as connection:
+        rows = connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN " + statement, tuple([None] * statement.count("?"))
+        ).fetchall()
+    return [row[-1] for row in rows]
+
+
+def test_hot_queries_use_indexes(client, count_queries):
+    root = create_category(client, "root")
+    child = create_category(client, "child", root["id"])
+    client.post("/items", json={
+        "name": "item", "category_id": child["id"], "parameter_value": "",
+        "unit": "шт", "cost_price": 100, "selling_price": 150, "mic": 0
+    }).raise_for_status()
+
+    hot_urls = (
+        "/categories?tab=0",  # корни вкладки
+        f"/categories?parent_id={root['id']}",  # дочерние категории
+        f"/categories?parent_id={root['id']}&limit=50&after_id={child['id']}",  # следующая страница
+        f"/items?category_id={child['id']}&limit=50",  # товары категории
+        f"/items?category_id={root['id']}&subtree=true&limit=50",  # товары поддерева по category_closure
+    )
+    for url in hot_urls:
+        client.get(url).raise_for_status()  # прогрев кэшей ролей и ревизии
+        for statement in capture_selects(client, count_queries, url):
+            plan = query_plan(statement)
+            scans = [step for step in plan if FULL_SCAN.search(step)]
+            assert not scans, f"{url}: {statement}\n" + "\n".join(plan)
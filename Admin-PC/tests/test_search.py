@@ -0,0 +1,64 @@
+import pytest
+
+
+def create_category(client, name, parent_id=None):
+    response = client.post("/categories", json={"name": name, "unit": "шт", "tab": 0, "parent_id": parent_id})
+    response.raise_for_status()
+    return response.json()
+
+
+def create_item(client, name, category_id, parameter_value=""):
+    response = client.post("/items", json={
+        "name": name, "category_id": category_id, "parameter_value": parameter_value,
+        "unit": "шт", "cost_price": 100, "selling_price": 150, "mic": 0
+    })
+    response.raise_for_status()
+    return response.json()
+
+
+def search(client, query, **params):
+    response = client.get("/items/search", params={"query": query, **params})
+    response.raise_for_status()
+    return [item["id"] for item in response.json()]
+
+
+@pytest.fixture
+def catalog(client):
+    fasteners = create_category(client, "Крепеж")
+    bolts = create_category(client, "Болты", fasteners["id"])
+    nuts = create_category(client, "Гайки", fasteners["id"])
+    return {
+        # Совпадение в названии весит больше, чем в параметре или названии категории
+        "by_category": create_item(client, "Шпилька М8", bolts["id"]),
+        "by_parameter": create_item(client, "Гайка М8", nuts["id"], parameter_value="под болт"),
+        "by_name": create_item(client, "Болт М8", nuts["id"]),
+        "bolts": bolts,
+        "nuts": nuts,
+    }
+
+
+def test_search_ranks_name_matches_first(client, catalog):
+    assert search(client, "болт") == [
+        catalog["by_name"]["id"], catalog["by_parameter"]["id"], catalog["by_category"]["id"]
+    ]
+
+
+def test_search_matches_word_prefixes_and_requires_all_words(client, catalog):
+    assert search(client, "бол") == search(client, "болт")
+    assert search(client, "гайк под") == [catalog["by_parameter"]["id"]]
+    assert search(client, "гайка шпилька") == []
+
+
+def test_search_scoped_to_category_subtree(client, catalog):
+    assert search(client, "болт", category_id=catalog["bolts"]["id"]) == [catalog["by_category"]["id"]]
+    assert search(client, "болт", category_id=catalog["nuts"]["id"]) == [
+        catalog["by_name"]["id"], catalog["by_parameter"]["id"]
+    ]
+
+
+def test_search_index_follows_renames(client, catalog):
+    client.put(f"/items/{catalog['by_name']['id']}", json={"name": "Винт М8"}).raise_for_status()
+    client.put(f"/categories/{catalog['bolts']['id']}", json={"name": "Шпильки"}).raise_for_status()
+
+    assert search(client, "болт") == [catalog["by_parameter"]["id"]]
+    assert search(client, "винт") == [catalog["by_name"]["id"]]
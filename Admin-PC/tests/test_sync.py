@@ -0,0 +1,80 @@
+import server
+
+
+def create_category(client, name, parent_id=None):
+    response = client.post("/categories", json={"name": name, "unit": "шт", "tab": 0, "parent_id": parent_id})
+    response.raise_for_status()
+    return response.json()
+
+
+def create_item(client, name, category_id):
+    response = client.post("/items", json={
+        "name": name, "category_id": category_id, "parameter_value": "",
+        "unit": "шт", "cost_price": 100, "selling_price": 150, "mic": 0
+    })
+    response.raise_for_status()
+    return response.json()
+
+
+def test_sync_returns_changed_and_deleted_rows(client):
+    first = create_category(client, "first")
+    second = create_category(client, "second")
+    child = create_category(client, "child", first["id"])
+    kept = create_item(client, "kept", child["id"])
+    removed = create_item(client, "removed", child["id"])
+    since = client.get("/sync").json()["revision"]
+
+    client.put(f"/items/{kept['id']}", json={"selling_price": 200}).raise_for_status()
+    client.put(f"/categories/{child['id']}", json={"parent_id": second["id"]}).raise_for_status()
+    client.delete(f"/items/{removed['id']}").raise_for_status()
+    payload = client.get("/sync", params={"since": since}).json()
+
+    assert payload["reset"] is False
+    assert payload["revision"] > since
+    assert [(row["id"], row["selling_price"]) for row in payload["changed"]["items"]] == [(kept["id"], 200)]
+    # Новый родитель тоже изменился: его content_type стал categories
+    categories = {row["id"]: row for row in payload["changed"]["categories"]}
+    assert set(categories) == {child["id"], second["id"]}
+    assert categories[child["id"]]["parent_id"] == second["id"]
+    assert payload["deleted"] == {"items": [removed["id"]]}
+
+
+def test_sync_from_current_revision_is_empty(client):
+    create_category(client, "root")
+    revision = client.get("/sync").json()["revision"]
+
+    payload = client.get("/sync", params={"since": revision}).json()
+
+    assert payload == {"revision": revision, "reset": False, "changed": {}, "deleted": {}}
+
+
+def test_sync_ahead_of_server_resets(client):
+    create_category(client, "root")
+    revision = client.get("/sync").json()["revision"]
+
+    assert client.get("/sync", params={"since": revision + 10}).json()["reset"] is True
+
+
+def test_compaction_keeps_latest_entries_and_resets_older_clients(client):
+    root = create_category(client, "root")
+    item = create_item(client, "item", root["id"])
+    removed = create_item(client, "removed", root["id"])
+    for price in (200, 300, 400):
+        client.put(f"/items/{item['id']}", json={"selling_price": price}).raise_for_status()
+    client.delete(f"/items/{removed['id']}").raise_for_status()
+    client.put(f"/categories/{root['id']}", json={"name": "renamed"}).raise_for_status()
+    floor = client.get("/sync").json()["revision"]
+
+    server.compact_change_log(floor)
+
+    with server.SessionLocal() as db:
+        entries = db.query(server.ChangeLog.table_name, server.ChangeLog.row_id).all()
+    # По одной записи на живую строку; удаление последнего товара - не последняя запись журнала и отброшено
+    assert sorted(entries) == [("categories", root["id"]), ("items", item["id"])]
+    assert client.get("/sync", params={"since": floor - 1}).json()["reset"] is True
+    assert client.get("/sync", params={"since": floor}).json()["changed"] == {}
+
+    client.put(f"/items/{item['id']}", json={"selling_price": 500}).raise_for_status()
+    payload = client.get("/sync", params={"since": floor}).json()
+    assert payload["revision"] > floor
+    assert [row["selling_price"] for row in payload["changed"]["items"]] == [500]
@@ -1,13 +1,66 @@
 from typing import Optional
 import sqlite3
-from pathlib import Path
+import threading
+from dbpool import db
 
-BASE_DIR = Path(__file__).parent.resolve()
-SAVE_DIR = BASE_DIR / "backend"
-DEFAULT_DB_PATH = SAVE_DIR / "back.db"
+CATALOG_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_categories_tab_parent_group_position ON categories (tab, parent_id, `group`, position)",
+    "CREATE INDEX IF NOT EXISTS ix_categories_parent_group_position ON categories (parent_id, `group`, position)",
+    "CREATE INDEX IF NOT EXISTS ix_items_category_id ON items (category_id)",
+]
+
+# Таблица замыкания категорий - та же схема и триггеры, что на сервере.
+# В скачанной back.db она уже есть, для старых баз строится при старте
+CATEGORY_CLOSURE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS category_closure (
+        ancestor INTEGER NOT NULL,
+        descendant INTEGER NOT NULL,
+        depth INTEGER NOT NULL,
+        PRIMARY KEY (ancestor, descendant)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_category_closure_descendant ON category_closure (descendant)",
+    """
+    CREATE TRIGGER IF NOT EXISTS category_closure_insert AFTER INSERT ON categories BEGIN
+        INSERT INTO category_closure (ancestor, descendant, depth)
+        SELECT ancestor, new.id, depth + 1 FROM category_closure WHERE descendant = new.parent_id
+        UNION ALL
+        SELECT new.id, new.id, 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS category_closure_move AFTER UPDATE OF parent_id ON categories
+    WHEN old.parent_id IS NOT new.parent_id BEGIN
+        DELETE FROM category_closure
+        WHERE descendant IN (SELECT descendant FROM category_closure WHERE ancestor = new.id)
+          AND ancestor NOT IN (SELECT descendant FROM category_closure WHERE ancestor = new.id);
+        INSERT INTO category_closure (ancestor, descendant, depth)
+        SELECT above.ancestor, below.descendant, above.depth + below.depth + 1
+        FROM category_closure above, category_closure below
+        WHERE above.descendant = new.parent_id AND below.ancestor = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS category_closure_delete AFTER DELETE ON categories BEGIN
+        DELETE FROM category_closure WHERE descendant = old.id OR ancestor = old.id;
+    END
+    """,
+]
+CATEGORY_CLOSURE_REBUILD = """
+    INSERT INTO category_closure (ancestor, descendant, depth)
+    WITH RECURSIVE tree(ancestor, descendant, depth) AS (
+        SELECT id, id, 0 FROM categories
+        UNION ALL
+        SELECT tree.ancestor, c.id, tree.depth + 1
+        FROM tree JOIN categories c ON c.parent_id = tree.descendant
+    )
+    SELECT ancestor, descendant, depth FROM tree
+"""
 
 def connect_db():
-    return sqlite3.connect(DEFAULT_DB_PATH)
+    """Соединение текущего потока - не закрывать, оно переиспользуется"""
+    return db.connection()
 
 def check_db_structure():
     """Проверяет и создает всю необходимую структуру БД"""
@@ -60,11 +113,22 @@ def check_db_structure():
         if 'mic' not in columns:
             cursor.execute("ALTER TABLE items ADD COLUMN mic INTEGER DEFAULT 0")
 
+        # Индексы под запросы каталога - те же, что на сервере
+        for statement in CATALOG_INDEXES:
+            cursor.execute(statement)
+
+        for statement in CATEGORY_CLOSURE_DDL:
+            cursor.execute(statement)
+        categories = cursor.execute("SELECT COUNT(*) FROM categories").fetchone()[0]
+        roots = cursor.execute("SELECT COUNT(*) FROM category_closure WHERE depth = 0").fetchone()[0]
+        if categories != roots:
+            cursor.execute("DELETE FROM category_closure")
+            cursor.execute(CATEGORY_CLOSURE_REBUILD)
+
         conn.commit()
     except sqlite3.Error as e:
+        conn.rollback()
         print(f"DB structure error: {e}")
-    finally:
-        conn.close()
 
 
 # Инициализация БД при старте
@@ -123,8 +187,80 @@ def get_categories(parent_id=None, tab=None):
     except sqlite3.Error as e:
         print(f"Get categories error: {e}")
         return []
-    finally:
-        conn.close()
+
+
+class CategoryIndex:
+    """Все категории в памяти: id -> категория, parent_id -> дети, tab -> корни.
+
+    Загружается одним запросом при первом обращении и живет до invalidate(),
+    который check_server вызывает после установки новых данных.
+    """
+
+    def __init__(self):
+        self.by_id = {}
+        self.children_by_parent = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def _load(self):
+        by_id = {}
+        children_by_parent = {}
+        try:
+            rows = connect_db().execute("""
+                SELECT id, name, parameter, unit, parent_id, tab, content_type, `group`, position
+                FROM categories
+                ORDER BY `group`, position
+            """).fetchall()
+        except sqlite3.Error as e:
+            print(f"Category index error: {e}")
+            rows = []
+
+        for row in rows:
+            category = {
+                'id': row[0],
+                'name': row[1],
+                'parameter': row[2],
+                'unit': row[3],
+                'parent_id': row[4],
+                'tab': row[5],
+                'content_type': row[6] or 'default',
+                'group': row[7],
+                'position': row[8]
+            }
+            by_id[category['id']] = category
+            # Порядок детей совпадает с ORDER BY `group`, position из get_categories
+            children_by_parent.setdefault(category['parent_id'], []).append(category)
+
+        self.by_id = by_id
+        self.children_by_parent = children_by_parent
+        self.loaded = True
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    self._load()
+
+    def invalidate(self):
+        self.loaded = False
+
+    def get(self, category_id) -> Optional[dict]:
+        self._ensure_loaded()
+        return self.by_id.get(category_id)
+
+    def children(self, parent_id, tab=None) -> list[dict]:
+        """Аналог get_categories(parent_id, tab) без обращения к БД"""
+        self._ensure_loaded()
+        children = self.children_by_parent.get(parent_id, [])
+        if tab is None:
+            return list(children)
+        return [category for category in children if category['tab'] == tab]
+
+    def roots(self, tab=None) -> list[dict]:
+        return self.children(None, tab)
+
+
+category_index = CategoryIndex()
 
 
 def get_items(category_id: int) -> list[dict]:
@@ -132,13 +268,8 @@ def get_items(category_id: int) -> list[dict]:
     conn = connect_db()
     cursor = conn.cursor()
 
+    # Поддерево берется из таблицы замыкания - индексный поиск вместо рекурсивного обхода
     query = """
-    WITH RECURSIVE subcategories AS (
-        SELECT id FROM categories WHERE id = ?
-        UNION ALL
-        SELECT c.id FROM categories c
-        INNER JOIN subcategories s ON c.parent_id = s.id
-    )
     SELECT
         i.id,
         i.name,
@@ -151,13 +282,12 @@ def get_items(category_id: int) -> list[dict]:
         i.mic,
         c.name as category_name,
         c.parameter as category_parameter
-    FROM items i
+    FROM category_closure cc
+    JOIN items i ON i.category_id = cc.descendant
     JOIN categories c ON i.category_id = c.id
-    WHERE i.category_id IN (SELECT id FROM subcategories)
+    WHERE cc.ancestor = ?
     """
 
-    params = [category_id]
-
     try:
         cursor.execute(query, [category_id])
         items = []
@@ -179,5 +309,3 @@ def get_items(category_id: int) -> list[dict]:
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return []
-    finally:
-        conn.close()
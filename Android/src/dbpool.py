@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+# Рабочая папка: на Android - приватная папка приложения, при запуске на ПК - папка с исходниками.
+# Путь к БД задается только здесь: main, bdinit, search и страницы работают с одним файлом
+# и одним менеджером, поэтому подмена файла после синхронизации видна всем
+BASE_DIR = Path(os.getenv("ANDROID_PRIVATE") or Path(__file__).parent.resolve())
+SAVE_DIR = BASE_DIR / "backend"
+SAVE_DIR.mkdir(parents=True, exist_ok=True)
+DEFAULT_DB_PATH = SAVE_DIR / "back.db"
+
+# Размер кэша подготовленных выражений на соединение
+CACHED_STATEMENTS = 256
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 67108864",  # 64 МБ
+    "PRAGMA cache_size = -8192",  # 8 МБ
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+def _casefold(value):
+    return value.casefold() if value else ""
+
+
+class ConnectionManager:
+    """Долгоживущее соединение с SQLite на каждый поток.
+
+    Соединение открывается при первом обращении из потока и переиспользуется,
+    поэтому запросы не платят за открытие файла, PRAGMA и холодный кэш страниц.
+    Перед заменой файла БД все соединения закрываются, после нее потоки
+    переоткрывают соединения при следующем запросе.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.generation = 0
+        self._local = threading.local()
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,  # close_all закрывает соединения из других потоков
+            cached_statements=CACHED_STATEMENTS
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        # SQLite lower() не знает кириллицу, регистр приводим через Python
+        conn.create_function("casefold", 1, _casefold, deterministic=True)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока, открывается заново после close_all"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation == self.generation:
+            return conn
+
+        with self._lock:
+            conn = self._open()
+            self._connections.add(conn)
+            self._local.conn = conn
+            self._local.generation = self.generation
+        return conn
+
+    def _close_connections(self):
+        self.generation += 1
+        for conn in self._connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Ошибка закрытия соединения с БД: {e}")
+        self._connections.clear()
+
+    def close_all(self):
+        """Закрывает соединения всех потоков - WAL сливается в основной файл"""
+        with self._lock:
+            self._close_connections()
+
+    def replace_file(self, new_path):
+        """Атомарно подменяет файл БД, пока ни одно соединение не открыто"""
+        with self._lock:
+            self._close_connections()
+            # WAL и shm старого файла не должны примениться к новому
+            for suffix in ("-wal", "-shm"):
+                Path(f"{self.db_path}{suffix}").unlink(missing_ok=True)
+            os.replace(new_path, self.db_path)
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_path) -> ConnectionManager:
+    """Один менеджер на файл БД, сколько бы модулей к нему ни обращалось"""
+    key = Path(db_path).resolve()
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = ConnectionManager(key)
+        return _managers[key]
+
+
+# Общий менеджер рабочей БД
+db = get_manager(DEFAULT_DB_PATH)
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+import zlib
+from pathlib import Path
+
+import aiohttp
+
+try:
+    import zstandard
+except ImportError:  # Без zstandard сервер пришлет gzip
+    zstandard = None
+
+DEFAULT_CONCURRENCY = 4
+CHUNK_SIZE = 64 * 1024
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5  # секунды, удваивается с каждой попыткой
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=10, sock_read=30)
+# Сжатия, которые умеет распаковывать клиент, в порядке предпочтения
+ACCEPT_ENCODING = "zstd, gzip" if zstandard else "gzip"
+
+
+class DownloadStats:
+    """Суммарная статистика загрузки вместо отчета по каждому файлу"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.files = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return (
+            f"Скачано файлов: {self.files}, ошибок: {self.failed}, "
+            f"{self.bytes / 1024 / 1024:.2f} МБ за {elapsed:.2f} с "
+            f"({self.bytes / 1024 / elapsed:.1f} КБ/с)"
+        )
+
+
+def create_session(concurrency=DEFAULT_CONCURRENCY, auto_decompress=True):
+    """Одна сессия с пулом keep-alive соединений на всю синхронизацию.
+
+    auto_decompress=False оставляет тело сжатым - его распаковывает fetch_to_file(decompress=True).
+    """
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    return aiohttp.ClientSession(connector=connector, timeout=REQUEST_TIMEOUT, auto_decompress=auto_decompress)
+
+
+def create_decompressor(encoding):
+    """Потоковый распаковщик для Content-Encoding ответа или None для несжатого тела"""
+    if encoding == "gzip":
+        return zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    if encoding == "zstd" and zstandard:
+        return zstandard.ZstdDecompressor().decompressobj()
+    if encoding:
+        raise aiohttp.ClientPayloadError(f"Неподдерживаемое сжатие: {encoding}")
+    return None
+
+
+def part_path(dest: Path) -> Path:
+    return dest.with_name(dest.name + ".part")
+
+
+async def fetch_to_file(session, url, dest: Path, expected_size=None, retries=MAX_RETRIES, resume=True, decompress=False):
+    """Скачивает url во временный .part файл с докачкой по Range и атомарно переименовывает в dest.
+
+    Данные пишутся потоково блоками по CHUNK_SIZE и сбрасываются на диск до переименования,
+    поэтому dest либо остается прежним, либо заменяется полностью скачанным файлом.
+    resume=False отключает докачку для файлов, которые могут измениться между попытками.
+    decompress=True запрашивает сжатый ответ и распаковывает его на лету - только с resume=False
+    и сессией create_session(auto_decompress=False).
+    Возвращает количество байт, полученных по сети.
+    """
+    part = part_path(dest)
+    received = 0
+
+    for attempt in range(retries + 1):
+        try:
+            if not resume:
+                part.unlink(missing_ok=True)
+            offset = part.stat().st_size if part.exists() else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            if decompress:
+                headers["Accept-Encoding"] = ACCEPT_ENCODING
+
+            async with session.get(url, headers=headers) as response:
+                if response.status == 416:
+                    # Частичный файл не соответствует серверному - качаем заново
+                    part.unlink(missing_ok=True)
+                    raise aiohttp.ClientPayloadError("Range not satisfiable")
+                if response.status not in (200, 206):
+                    raise aiohttp.ClientResponseError(
+                        response.request_info, response.history,
+                        status=response.status, message=response.reason or ""
+                    )
+
+                decompressor = create_decompressor(response.headers.get("Content-Encoding")) if decompress else None
+
+                # 200 на запрос с Range означает, что сервер отдает файл целиком
+                mode = "ab" if response.status == 206 else "wb"
+                with open(part, mode) as f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        received += len(chunk)
+                        f.write(decompressor.decompress(chunk) if decompressor else chunk)
+                    if decompressor and hasattr(decompressor, "flush"):
+                        f.write(decompressor.flush())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            if expected_size is not None and part.stat().st_size != expected_size:
+                part.unlink(missing_ok=True)
+                raise aiohttp.ClientPayloadError(f"Размер {dest.name} не совпадает с ожидаемым")
+
+            os.replace(part, dest)
+            return received
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Ошибки клиента (404 и т.п.) повтором не исправить
+            client_error = isinstance(e, aiohttp.ClientResponseError) and e.status < 500
+            if attempt == retries or client_error:
+                raise
+            delay = BACKOFF_BASE * 2 ** attempt
+            print(f"Повтор загрузки {dest.name} через {delay:.1f} с: {e}")
+            await asyncio.sleep(delay)
+
+
+async def download_files(session, jobs, concurrency=DEFAULT_CONCURRENCY):
+    """Параллельно скачивает jobs - список (url, dest, expected_size).
+
+    Возвращает множество успешно скачанных путей и статистику.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = DownloadStats()
+    completed = set()
+
+    async def worker(url, dest, expected_size):
+        async with semaphore:
+            try:
+                received = await fetch_to_file(session, url, dest, expected_size)
+                stats.bytes += received
+                stats.files += 1
+                completed.add(dest)
+            except Exception as e:
+                stats.failed += 1
+                print(f"Ошибка при скачивании {dest.name}: {e}")
+
+    await asyncio.gather(*(worker(*job) for job in jobs))
+    return completed, stats
@@ -2,33 +2,41 @@ import flet as ft
 import aiohttp
 import sqlite3
 import bcrypt
-import time
 from pages.home import home_page # Предполагается, что этот файл существует
-from pathlib import Path
+from downloader import create_session, download_files, fetch_to_file
+from dbpool import db, DEFAULT_DB_PATH, SAVE_DIR
+from bdinit import category_index, CATEGORY_CLOSURE_REBUILD
 import asyncio
+import json
 import os
 
 # Конфигурация сервера
 SERVER_IP = "IP"
 SERVER_PORT = "PORT"
 SCAN_INTERVAL = 60
+IMG_DOWNLOAD_CONCURRENCY = 4
 
 # Пути для файлов
-BASE_DIR = Path(os.getenv("ANDROID_PRIVATE", "")) # ANDROID_PRIVATE обычно указывает на files dir
-SAVE_DIR = BASE_DIR / "backend"
-SAVE_DIR.mkdir(exist_ok=True)
-DEFAULT_DB_PATH = SAVE_DIR / "back.db"
+# Рабочая папка и путь к БД общие для всех модулей - см. dbpool
+DOWNLOAD_DB_PATH = SAVE_DIR / "back.db.download"
 IMGS_DIR = SAVE_DIR / "Imgs"
 IMGS_DIR.mkdir(exist_ok=True)
 LAST_SYNC_PATH = SAVE_DIR / "last_sync.txt"
+IMGS_MANIFEST_PATH = SAVE_DIR / "imgs_manifest.json"
 HISTORY_DIR = SAVE_DIR / "history"
 HISTORY_DIR.mkdir(exist_ok=True)
 EXTERNAL_SELECTED_DIR = "external_selected_dir"
+# Таблицы, синхронизируемые через /sync (в порядке зависимостей)
+SYNC_TABLES = ("roles", "users", "categories", "items")
 
 async def get_server_db_hash():
+    local_hash = get_local_db_hash()
+    headers = {"If-None-Match": local_hash} if local_hash else {}
     try:
         async with aiohttp.ClientSession() as session:
-            async with session.get(f"http://{SERVER_IP}:{SERVER_PORT}/db_hash") as response:
+            async with session.get(f"http://{SERVER_IP}:{SERVER_PORT}/db_hash", headers=headers) as response:
+                if response.status == 304:
+                    return local_hash
                 return await response.text()
     except Exception as e:
         print(f"Ошибка получения хеша БД с сервера: {e}")
@@ -39,38 +47,158 @@ def get_local_db_hash():
 
 async def download_db():
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"http://{SERVER_IP}:{SERVER_PORT}/download_db") as response:
-                with open(DEFAULT_DB_PATH, "wb") as f:
-                    f.write(await response.read())
-                print("DB downloaded successfully")
+        async with create_session(1, auto_decompress=False) as session:
+            # Файл качается во временный back.db.download.part и подменяет рабочую БД только целиком.
+            # Снимок приходит сжатым (zstd или gzip) и распаковывается по мере получения
+            received = await fetch_to_file(
+                session,
+                f"http://{SERVER_IP}:{SERVER_PORT}/download_db",
+                DOWNLOAD_DB_PATH,
+                resume=False,
+                decompress=True
+            )
+        print(f"Получено {received / 1024:.0f} КБ, размер БД {DOWNLOAD_DB_PATH.stat().st_size / 1024:.0f} КБ")
+        # Соединения со старым файлом закрываются до подмены, потоки переоткроют их сами
+        db.replace_file(DOWNLOAD_DB_PATH)
+        print("DB downloaded successfully")
+        return True
     except Exception as e:
         print(f"DB download failed: {e}")
+        return False
+
+def get_local_revision():
+    """Возвращает ревизию локальной БД или None, если нужна полная загрузка"""
+    if not DEFAULT_DB_PATH.exists():
+        return None
+
+    conn = db.connection()
+    try:
+        cursor = conn.cursor()
+        tables = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "sync_state" in tables:
+            row = cursor.execute("SELECT revision FROM sync_state WHERE id = 1").fetchone()
+            if row:
+                return row[0]
+        if "change_log" in tables:
+            # Сразу после полной загрузки ревизия берется из журнала сервера
+            return cursor.execute("SELECT COALESCE(MAX(id), 0) FROM change_log").fetchone()[0]
+        return None
+    except sqlite3.Error as e:
+        print(f"Ошибка чтения ревизии БД: {e}")
+        return None
+
+def apply_db_changes(payload):
+    """Применяет изменения с сервера к локальной БД одной транзакцией"""
+    changed = payload.get("changed", {})
+    deleted = payload.get("deleted", {})
+
+    conn = db.connection()
+    with conn:
+        cursor = conn.cursor()
+        for table in reversed(SYNC_TABLES):
+            ids = deleted.get(table)
+            if ids:
+                cursor.executemany(f"DELETE FROM {table} WHERE id = ?", [(row_id,) for row_id in ids])
+
+        for table in SYNC_TABLES:
+            rows = changed.get(table)
+            if not rows:
+                continue
+            local_columns = {col[1] for col in cursor.execute(f"PRAGMA table_info({table})")}
+            columns = [col for col in rows[0] if col in local_columns]
+            column_list = ", ".join(f"`{col}`" for col in columns)
+            placeholders = ", ".join("?" * len(columns))
+            # UPSERT вместо REPLACE: существующие строки обновляются, и срабатывают
+            # триггеры UPDATE, которые поддерживают category_closure и items_fts
+            assignments = ", ".join(f"`{col}` = excluded.`{col}`" for col in columns if col != "id")
+            cursor.executemany(
+                f"INSERT INTO {table} ({column_list}) VALUES ({placeholders}) "
+                f"ON CONFLICT(id) DO UPDATE SET {assignments}",
+                [tuple(row.get(col) for col in columns) for row in rows]
+            )
+
+        if changed.get("categories") or deleted.get("categories"):
+            # Строки приходят в порядке id, а не дерева - пересобираем замыкание целиком
+            cursor.execute("DELETE FROM category_closure")
+            cursor.execute(CATEGORY_CLOSURE_REBUILD)
+
+        cursor.execute("CREATE TABLE IF NOT EXISTS sync_state (id INTEGER PRIMARY KEY, revision INTEGER)")
+        cursor.execute("INSERT OR REPLACE INTO sync_state (id, revision) VALUES (1, ?)", (payload["revision"],))
+
+async def sync_db_changes():
+    """Подтягивает только изменённые строки. Возвращает False, если нужна полная загрузка"""
+    revision = get_local_revision()
+    if revision is None:
+        return False
 
-async def download_imgs():
     try:
         async with aiohttp.ClientSession() as session:
-            async with session.get(f"http://{SERVER_IP}:{SERVER_PORT}/list_imgs") as response:
-                if response.ok:
-                    files = (await response.json()).get("files", [])
-                    print(f"Files to download: {files}")
-
-                    for file in files:
-                        start_time = time.time()
-                        img_url = f"http://{SERVER_IP}:{SERVER_PORT}/download_img/{file}"
-                        async with session.get(img_url) as img_response:
-                            if img_response.status == 200:
-                                img_data = await img_response.read()
-                                (IMGS_DIR / file).write_bytes(img_data)
-                                end_time = time.time()
-                                file_size = len(img_data) / 1024
-                                print(
-                                    f"Изображение {file} скачано за {end_time - start_time:.2f} секунд. Размер: {file_size:.2f} КБ"
-                                )
-                            else:
-                                print(f"Ошибка при скачивании {file}. Статус: {img_response.status}")
-                else:
-                    print(f"Ошибка при получении списка файлов. Статус: {response.status}")
+            async with session.get(
+                f"http://{SERVER_IP}:{SERVER_PORT}/sync",
+                params={"since": revision}
+            ) as response:
+                if response.status != 200:
+                    print(f"Ошибка синхронизации. Статус: {response.status}")
+                    return False
+                payload = await response.json()
+
+        if payload.get("reset"):
+            return False
+
+        apply_db_changes(payload)
+        changed_count = sum(len(rows) for rows in payload.get("changed", {}).values())
+        deleted_count = sum(len(ids) for ids in payload.get("deleted", {}).values())
+        print(f"Синхронизация до ревизии {payload['revision']}: изменено {changed_count}, удалено {deleted_count}")
+        return True
+    except Exception as e:
+        print(f"Ошибка синхронизации изменений: {e}")
+        return False
+
+def load_imgs_manifest():
+    """Локальный манифест: имя файла -> хеш, с которым он был скачан"""
+    try:
+        return json.loads(IMGS_MANIFEST_PATH.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_imgs_manifest(manifest):
+    IMGS_MANIFEST_PATH.write_text(json.dumps(manifest))
+
+async def download_imgs():
+    try:
+        async with create_session(IMG_DOWNLOAD_CONCURRENCY) as session:
+            async with session.get(f"http://{SERVER_IP}:{SERVER_PORT}/imgs/manifest") as response:
+                if not response.ok:
+                    print(f"Ошибка при получении манифеста изображений. Статус: {response.status}")
+                    return
+                remote = {entry["file"]: entry for entry in (await response.json()).get("files", [])}
+
+            local = load_imgs_manifest()
+            files = [
+                name for name, entry in remote.items()
+                if local.get(name) != entry["hash"]
+                or not (IMGS_DIR / name).exists()
+                or (IMGS_DIR / name).stat().st_size != entry["size"]
+            ]
+            print(f"Изображений к загрузке: {len(files)} из {len(remote)}")
+
+            jobs = [
+                (f"http://{SERVER_IP}:{SERVER_PORT}/download_img/{file}", IMGS_DIR / file, remote[file]["size"])
+                for file in files
+            ]
+            completed, stats = await download_files(session, jobs, IMG_DOWNLOAD_CONCURRENCY)
+            for path in completed:
+                local[path.name] = remote[path.name]["hash"]
+            print(stats.report())
+
+        # Удаляем изображения и недокачанные файлы, которых больше нет на сервере
+        for path in list(IMGS_DIR.glob("*.jpg")) + list(IMGS_DIR.glob("*.jpg.part")):
+            if path.name.removesuffix(".part") not in remote:
+                path.unlink()
+                local.pop(path.name, None)
+                print(f"Удалено устаревшее изображение {path.name}")
+
+        save_imgs_manifest({name: digest for name, digest in local.items() if name in remote})
     except Exception as e:
         print(f"Ошибка при скачивании изображений: {e}")
 
@@ -80,10 +208,13 @@ async def check_server():
         local_hash = get_local_db_hash()
 
         if server_hash and server_hash != local_hash:
-            await download_db()
+            synced = await sync_db_changes() or await download_db()
             await download_imgs()
-            with open(LAST_SYNC_PATH, "w") as f:
-                f.write(server_hash)
+            if synced:
+                # Категории перечитаются из новой БД при следующем обращении
+                category_index.invalidate()
+                with open(LAST_SYNC_PATH, "w") as f:
+                    f.write(server_hash)
     except Exception as e:
         print(f"Ошибка при проверке сервера и синхронизации: {e}")
         # raise # Можно не пробрасывать ошибку дальше, чтобы приложение не падало полностью
@@ -214,12 +345,13 @@ def login_page(page: ft.Page):
             print(f"База данных не найдена по пути: {DEFAULT_DB_PATH}")
             return False, None
             
-        conn = sqlite3.connect(DEFAULT_DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT password, full_name FROM users WHERE username = ?", (username,))
-        result = cursor.fetchone()
-        conn.close()
+        try:
+            result = db.connection().execute(
+                "SELECT password, full_name FROM users WHERE username = ?", (username,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Ошибка чтения пользователя: {e}")
+            return False, None
 
         if not result:
             return False, None
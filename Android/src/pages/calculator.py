@@ -2,20 +2,13 @@ import flet as ft
 from pages.tovari import IMGS_DIR, DEFAULT_IMAGE_PATH
 import openpyxl
 from datetime import datetime
-import os
 from pathlib import Path
 import re
-import platform
 import shutil
+from dbpool import SAVE_DIR
 
-if platform.system() == "Windows":
-    BASE_DIR = Path(__file__).resolve().parent.parent
-else:
-    BASE_DIR = Path(os.getenv("ANDROID_PRIVATE", ""))
-SAVE_DIR = BASE_DIR / "backend"
 SHABLON_DIR = SAVE_DIR / "SHABLON"
 HISTORY_DIR = SAVE_DIR / "history"
-DEFAULT_DB_PATH = SAVE_DIR / "back.db"
 
 EXTERNAL_SELECTED_DIR = "external_selected_dir"
 
@@ -1,8 +1,13 @@
+import asyncio
 import flet as ft
 from plugins.card_styles import create_card
-from bdinit import get_categories
+from bdinit import category_index
+from search import item_search
 from itertools import groupby
 
+# Пауза после последнего нажатия клавиши перед поиском, секунды
+SEARCH_DEBOUNCE = 0.25
+
 def create_category_card(category, on_click_handler):
     return ft.Container(
         content=create_card(
@@ -23,7 +28,7 @@ def categories_page(page: ft.Page, on_category_click, tab: int):
 
     try:
         # Получаем только категории верхнего уровня для выбранной вкладки
-        top_categories = get_categories(parent_id=None, tab=tab)
+        top_categories = category_index.roots(tab)
 
         if not top_categories:
             return ft.Text("Нет категорий в этой вкладке")
@@ -44,10 +49,56 @@ def categories_page(page: ft.Page, on_category_click, tab: int):
         progress.visible = False
         page.update()
 
+    category_list = ft.ListView(
+        controls=category_columns,
+        expand=True
+    )
+    results_grid = ft.GridView(
+        runs_count=2,
+        max_extent=180,
+        spacing=10,
+        run_spacing=10,
+        padding=10,
+        child_aspect_ratio=0.75,
+        expand=True,
+        visible=False,
+    )
+    no_results = ft.Text("Ничего не найдено", italic=True, visible=False)
+    search_state = {"generation": 0}
+
+    async def on_search_change(e):
+        # Debounce: ищем только если за паузу не было новых нажатий
+        search_state["generation"] += 1
+        generation = search_state["generation"]
+        await asyncio.sleep(SEARCH_DEBOUNCE)
+        if generation != search_state["generation"]:
+            return
+
+        # Импорт здесь: pages.tovari сам импортирует этот модуль
+        from pages.tovari import create_item_card
+
+        query = (e.control.value or "").strip()
+        results = item_search.search(query, tab=tab) if query else []
+        if generation != search_state["generation"]:
+            return
+
+        results_grid.controls = [create_item_card(page, item) for item in results]
+        results_grid.visible = bool(results)
+        no_results.visible = bool(query) and not results
+        category_list.visible = not query
+        page.update()
+
+    search_field = ft.TextField(
+        label="Поиск товаров",
+        prefix_icon=ft.Icons.SEARCH,
+        on_change=on_search_change,
+        dense=True,
+    )
+
     return ft.Container(
-        content=ft.ListView(
-            controls=category_columns,
-            expand=True
+        content=ft.Column(
+            controls=[search_field, no_results, results_grid, category_list],
+            expand=True,
         ),
         expand=True,
         padding=10
@@ -1,5 +1,5 @@
 import flet as ft
-from bdinit import get_items, get_categories
+from bdinit import get_items, category_index
 from pathlib import Path
 import logging
 from pages.catalogue import create_category_card
@@ -13,7 +13,7 @@ BASE_DIR = Path(__file__).parent.parent.resolve()
 IMGS_DIR = BASE_DIR / "backend" / "Imgs"
 DEFAULT_IMAGE_PATH = BASE_DIR / "default.jpg"
 
-def create_item_card(page, item, categories):
+def create_item_card(page, item):
     # Логирование данных товара
     logger.info(f"Creating card for item: {item.get('name')}")
     
@@ -51,7 +51,7 @@ def create_item_card(page, item, categories):
     # Формирование текста параметра
     parameter_text = ""
     if item.get('parameter_value'):
-        category = next((cat for cat in categories if cat['id'] == item['category_id']), None)
+        category = category_index.get(item['category_id'])
         if category and category.get('parameter'):
             parameter_text = f"{category['parameter']}: {item['parameter_value']}"
         else:
@@ -168,7 +168,7 @@ def create_item_card(page, item, categories):
 
     return card_container
 
-def create_item_card(page, item, categories):
+def create_item_card(page, item):
     # Логирование данных товара
     logger.info(f"Creating card for item: {item.get('name')}")
     
@@ -239,7 +239,7 @@ def create_item_card(page, item, categories):
     # Формирование текста параметра
     parameter_text = ""
     if item.get('parameter_value'):
-        category = next((cat for cat in categories if cat['id'] == item['category_id']), None)
+        category = category_index.get(item['category_id'])
         if category and category.get('parameter'):
             parameter_text = f"{category['parameter']}: {item['parameter_value']}"
         else:
@@ -377,13 +377,12 @@ def items_page(page: ft.Page, category_id: int, on_back_click, tab=None):
         items_data = get_items(category_id)
         logger.info(f"Loaded {len(items_data)} items for category {category_id}")
         
-        # Загружаем данные о текущей категории
-        category_info = next((c for c in get_categories() if c['id'] == category_id), None)
+        # Данные о текущей категории и подкатегориях берутся из индекса в памяти
+        category_info = category_index.get(category_id)
         
-        # Загружаем подкатегории
         subcategories = []
         if category_info:
-            subcategories = get_categories(parent_id=category_id, tab=category_info.get('tab'))
+            subcategories = category_index.children(category_id, tab=category_info.get('tab'))
         
         # Создаем кнопку "Назад"
         back_button = ft.ElevatedButton(
@@ -408,15 +407,12 @@ def items_page(page: ft.Page, category_id: int, on_back_click, tab=None):
                 page.session.get("services_container").content = new_content
             page.update()
         
-        # Получаем все категории для параметров товаров
-        all_categories = get_categories()
-        
         # Создаем сетку для товаров
         items_grid = None
         if items_data:
             item_controls = []
             for item in items_data:
-                item_card = create_item_card(page, item, all_categories)
+                item_card = create_item_card(page, item)
                 item_controls.append(item_card)
                 
             items_grid = ft.GridView(
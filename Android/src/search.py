@@ -0,0 +1,159 @@
+import re
+import sqlite3
+from dbpool import DEFAULT_DB_PATH, get_manager
+
+SEARCH_LIMIT = 30
+
+# Тот же индекс, что создает сервер. Если база пришла без него - строим локально
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        name, parameter_value, category_name,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts (rowid, name, parameter_value, category_name)
+        VALUES (new.id, new.name, new.parameter_value, (SELECT name FROM categories WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+        DELETE FROM items_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE ON items BEGIN
+        DELETE FROM items_fts WHERE rowid = old.id;
+        INSERT INTO items_fts (rowid, name, parameter_value, category_name)
+        VALUES (new.id, new.name, new.parameter_value, (SELECT name FROM categories WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_category_update AFTER UPDATE OF name ON categories BEGIN
+        UPDATE items_fts SET category_name = new.name
+        WHERE rowid IN (SELECT id FROM items WHERE category_id = new.id);
+    END
+    """,
+]
+SEARCH_INDEX_REBUILD = """
+    INSERT INTO items_fts (rowid, name, parameter_value, category_name)
+    SELECT i.id, i.name, i.parameter_value, c.name
+    FROM items i LEFT JOIN categories c ON c.id = i.category_id
+"""
+
+ITEM_COLUMNS = """
+    i.id,
+    i.name,
+    i.category_id,
+    i.parameter_value,
+    i.unit,
+    i.cost_price,
+    i.selling_price,
+    i.image_id,
+    i.mic,
+    c.name as category_name,
+    c.parameter as category_parameter
+"""
+
+FTS_QUERY = f"""
+    SELECT {ITEM_COLUMNS}
+    FROM items_fts
+    JOIN items i ON i.id = items_fts.rowid
+    LEFT JOIN categories c ON c.id = i.category_id
+    WHERE items_fts MATCH ?
+"""
+FTS_ORDER = " ORDER BY bm25(items_fts, 10.0, 2.0, 1.0) LIMIT ?"
+
+# Без FTS5: регистронезависимое сравнение через casefold из dbpool
+FALLBACK_QUERY = f"""
+    SELECT {ITEM_COLUMNS}
+    FROM items i
+    LEFT JOIN categories c ON c.id = i.category_id
+    WHERE (casefold(i.name) LIKE ? OR casefold(i.parameter_value) LIKE ? OR casefold(c.name) LIKE ?)
+"""
+
+
+def build_match_query(query: str) -> str:
+    # Каждое слово ищется по префиксу, все слова должны совпасть
+    tokens = re.findall(r"\w+", query)
+    return " ".join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+
+
+class ItemSearch:
+    """Поиск по локальной back.db через постоянные соединения dbpool"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db = get_manager(db_path)
+        self.use_fts = False
+        # Поколение соединений, для которого проверялся индекс; после замены файла проверяем заново
+        self.index_generation = None
+
+    def _connection(self):
+        conn = self.db.connection()
+        if self.index_generation != self.db.generation:
+            self.use_fts = self._ensure_index(conn)
+            self.index_generation = self.db.generation
+        return conn
+
+    def _ensure_index(self, conn):
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'items_fts'"
+            ).fetchone()
+            if not exists:
+                with conn:
+                    for statement in SEARCH_INDEX_DDL:
+                        conn.execute(statement)
+                    conn.execute(SEARCH_INDEX_REBUILD)
+            return True
+        except sqlite3.Error as e:
+            print(f"Полнотекстовый индекс недоступен, используется простой поиск: {e}")
+            return False
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT, tab=None) -> list[dict]:
+        """Возвращает до limit товаров в формате bdinit.get_items, лучшие совпадения первыми"""
+        query = query.strip()
+        if not query:
+            return []
+
+        tab_filter = " AND c.tab = ?" if tab is not None else ""
+        tab_params = (tab,) if tab is not None else ()
+
+        try:
+            conn = self._connection()
+            if self.use_fts:
+                match = build_match_query(query)
+                if not match:
+                    return []
+                cursor = conn.execute(FTS_QUERY + tab_filter + FTS_ORDER, (match, *tab_params, limit))
+            else:
+                pattern = f"%{query.casefold()}%"
+                cursor = conn.execute(
+                    FALLBACK_QUERY + tab_filter + " LIMIT ?",
+                    (pattern, pattern, pattern, *tab_params, limit)
+                )
+
+            return [
+                {
+                    'id': row[0],
+                    'name': row[1],
+                    'category_id': row[2],
+                    'parameter_value': row[3],
+                    'unit': row[4],
+                    'cost_price': row[5],
+                    'selling_price': row[6],
+                    'image_id': row[7],
+                    'mic': row[8],
+                    'category_name': row[9],
+                    'category_parameter': row[10]
+                }
+                for row in cursor.fetchall()
+            ]
+        except sqlite3.Error as e:
+            print(f"Search error: {e}")
+            return []
+
+
+item_search = ItemSearch()